@@ -1,24 +1,51 @@
 import os
 
+from formats.activitynet.segments import SegmentTable
+
 
 class ActivityNetAnnotation:
     """
     This class is responsible for creating an annotation from given parameters.
     It provides methods to get the duration, resolution, URL, subset, and annotations of a video file.
+    The segments are kept in a columnar SegmentTable; the annotations property builds the ActivityNet dicts on demand.
+    source keeps the path of the source video after staging has renamed the video; it is not part of the outputs.
     """
 
+    __slots__ = ('filename', 'label', 'duration', 'resolution', 'url',
+                 'frames', 'subset', 'segments', 'view', 'source')
+
     def __init__(self, parent_label: str, filename: str, label: str, coordinates: list, video_info: tuple):
         self.filename = filename
         self.label = parent_label
+        self.set_video_info(video_info)
+        self.subset = 'training'
+        self.segments = SegmentTable()
+        self.add_annotation(coordinates, label)
+        self.view = None
+        self.source = filename
+
+    def set_video_info(self, video_info: tuple):
         self.duration = video_info[0] if video_info is not None else 0
         self.resolution = video_info[1] if video_info is not None else ''
         self.url = video_info[2] if video_info is not None else ''
         self.frames = video_info[3] if video_info is not None else 0
-        self.subset = 'training'
-        self.annotations = self._get_annotations(coordinates, label)
 
-    def _get_annotations(self, coordinates, label):
-        return [{'segment': coordinates, 'label': label}]
+    @property
+    def annotations(self):
+        return [{'segment': [start, end], 'label': label} for start, end, label in self.segments]
 
     def add_annotation(self, coordinates, label):
-        self.annotations.extend(self._get_annotations(coordinates, label))
+        self.segments.append(coordinates, label)
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'label': self.label,
+            'duration': self.duration,
+            'resolution': self.resolution,
+            'url': self.url,
+            'frames': self.frames,
+            'subset': self.subset,
+            'annotations': self.annotations,
+            'view': self.view
+        }
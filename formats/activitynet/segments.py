@@ -0,0 +1,100 @@
+import sys
+from array import array
+
+
+class LabelVocabulary:
+    """
+    This class is responsible for interning segment labels as small integer codes.
+    Codes are shared by every SegmentTable of a process, so each distinct label string is stored once.
+    """
+
+    labels = []
+    codes = {}
+
+    @classmethod
+    def encode(cls, label: str) -> int:
+        code = cls.codes.get(label)
+        if code is None:
+            code = cls.codes[label] = len(cls.labels)
+            cls.labels.append(sys.intern(label))
+        return code
+
+    @classmethod
+    def decode(cls, code: int) -> str:
+        return cls.labels[code]
+
+
+class SegmentTable:
+    """
+    This class is responsible for storing the temporal segments of one video column by column:
+    float64 start and end times and interned label codes, instead of one dict per segment.
+    A flags column remembers which times were integers in the VIA export, so they are given back as ints and
+    the outputs keep the original formatting (e.g. [1, 3], not [1.0, 3.0]).
+    as_arrays() returns NumPy views of the columns without copying them; release the views before appending
+    more segments, since an array that is exporting its buffer cannot grow.
+    """
+
+    __slots__ = ('starts', 'ends', 'codes', 'flags')
+
+    INT_START = 1
+    INT_END = 2
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.codes = array('i')
+        self.flags = array('B')
+
+    def append(self, coordinates, label: str):
+        # A VIA point annotation only has one coordinate; it becomes an empty segment at that time
+        start, end = coordinates[0], coordinates[-1]
+        self.starts.append(start)
+        self.ends.append(end)
+        self.codes.append(LabelVocabulary.encode(label))
+        self.flags.append((self.INT_START if isinstance(start, int) else 0) |
+                          (self.INT_END if isinstance(end, int) else 0))
+
+    def copy(self):
+        table = SegmentTable()
+        table.starts.extend(self.starts)
+        table.ends.extend(self.ends)
+        table.codes.extend(self.codes)
+        table.flags.extend(self.flags)
+        return table
+
+    def labels(self):
+        return [LabelVocabulary.decode(code) for code in self.codes]
+
+    def label_set(self):
+        return {LabelVocabulary.decode(code) for code in set(self.codes)}
+
+    def as_arrays(self):
+        """
+        Returns (starts, ends, codes) as NumPy arrays sharing the memory of the columns.
+        """
+        import numpy as np
+        return (np.frombuffer(self.starts, dtype=np.float64),
+                np.frombuffer(self.ends, dtype=np.float64),
+                np.frombuffer(self.codes, dtype=np.intc))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        decode = LabelVocabulary.decode
+        for start, end, code, flags in zip(self.starts, self.ends, self.codes, self.flags):
+            if flags:
+                start = int(start) if flags & self.INT_START else start
+                end = int(end) if flags & self.INT_END else end
+            yield start, end, decode(code)
+
+    def __getstate__(self):
+        # Label codes are only meaningful within one process, so pickles carry the label strings
+        return (self.starts, self.ends, self.labels(), self.flags)
+
+    def __setstate__(self, state):
+        starts, ends, labels, flags = state
+        self.starts = starts
+        self.ends = ends
+        self.codes = array('i', map(LabelVocabulary.encode, labels))
+        self.flags = flags
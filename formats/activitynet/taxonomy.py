@@ -1,12 +1,19 @@
+from utils.annotation_store import AnnotationStore
+
+
 class Taxonomy:
     """
     This class is responsible for creating a taxonomy.json from labels.
     It provides methods to create a node, find a node, convert labels into a taxonomy, and get the taxonomy.
+    Labels are either an AnnotationStore or a precomputed mapping of coarse labels to their fine labels.
+    Every coarse label and every (coarse, fine) label pair becomes exactly one node, in sorted order,
+    so node IDs depend only on the label vocabulary.
     """
 
     def __init__(self, labels):
         self.labels = labels
         self.nodes = []
+        self.node_index = {}
 
         self.convert()
 
@@ -19,30 +26,32 @@ class Taxonomy:
         }
 
     def _find_node(self, node_name: str):
-        for node in self.nodes:
-            if node['nodeName'] == node_name:
-                return (node['nodeId'], node['nodeName'])
-        return None
+        node = self.node_index.get(node_name)
+        if node is None:
+            return None
+        return (node['nodeId'], node['nodeName'])
+
+    def _get_label_sets(self):
+        if isinstance(self.labels, AnnotationStore):
+            return self.labels.get_label_sets()
+        return self.labels
 
     def convert(self):
         self.nodes.append(self._create_node('Root'))
 
         parent_id = 1
+        label_sets = self._get_label_sets()
 
-        if self.labels:  # Ensure self.labels is not empty
-            print("First item in self.labels:", self.labels[0])
-
-        second_node_names = {label.label for label in self.labels}
-
-        for second_node_name in second_node_names:
-            self.nodes.append(self._create_node(
-                second_node_name, 'Root', parent_id))
+        for second_node_name in sorted(label_sets):
+            node = self._create_node(second_node_name, 'Root', parent_id)
+            self.nodes.append(node)
+            self.node_index[second_node_name] = node
 
-        for label in self.labels:
-            parent_id, parent_name = self._find_node(label.label)
-            for annotation in label.annotations:
+        for second_node_name in sorted(label_sets):
+            parent_id, parent_name = self._find_node(second_node_name)
+            for label in sorted(label_sets[second_node_name]):
                 self.nodes.append(self._create_node(
-                    annotation['label'], parent_id, parent_name)
+                    label, parent_id, parent_name)
                 )
 
     def get(self):
@@ -1,37 +1,45 @@
-import os
 from formats.activitynet.annotation import ActivityNetAnnotation
 from utils.video_processor import VideoProcessor
 
 
 class NUYLSushiAnnotation:
+    __slots__ = ('segments', 'category', 'view_type', 'gyroscope_data',
+                 'weight_g', 'image_sampling')
+
     def __init__(self, annotation: ActivityNetAnnotation, video_processor: VideoProcessor) -> None:
-        self.annotations = self._convert_annotations(annotation.annotations)
+        # Shares the segment columns of the ActivityNet annotation instead of copying them
+        self.segments = annotation.segments
         self.category = annotation.label
         self.view_type = annotation.view
         self.gyroscope_data = "path/to/gyroscope_data.csv"
         self.weight_g = []
 
         self.image_sampling = self._create_image_sampling(
-            annotation.url, self.annotations, video_processor)
-
-    def _convert_annotations(self, annotations):
-        converted_annotations = []
-        for ann in annotations:
-            converted_annotation = {
-                "start_time": ann['segment'][0],
-                "end_time": ann['segment'][1],
-                "action": ann['label']
-            }
-            converted_annotations.append(converted_annotation)
-        return converted_annotations
-
-    def _create_image_sampling(self, filename, annotations, video_processor):
+            annotation.url, self.segments, video_processor)
+
+    @property
+    def annotations(self):
+        return [{"start_time": start, "end_time": end, "action": label}
+                for start, end, label in self.segments]
+
+    def to_dict(self):
+        return {
+            "annotations": self.annotations,
+            "category": self.category,
+            "view_type": self.view_type,
+            "gyroscope_data": self.gyroscope_data,
+            "weight_g": self.weight_g,
+            "image_sampling": self.image_sampling
+        }
+
+    def _create_image_sampling(self, filename, segments, video_processor):
         image_text_pairs = []
-        image_pairs = video_processor.process_video(filename, annotations)
-        for path, t in image_pairs:
-            text_description = self._get_text_description_for_time(t)
+        image_pairs = video_processor.process_video(filename, segments)
+        text_descriptions = self._get_text_descriptions_for_times(
+            [t for _, t in image_pairs])
+        for (image, _), text_description in zip(image_pairs, text_descriptions):
             image_text_pairs.append({
-                "image_path": os.path.normpath(path),
+                **video_processor.get_image_entry(image),
                 "text_description": text_description
             })
         return {
@@ -39,9 +47,7 @@ class NUYLSushiAnnotation:
             "image_text_pairs": image_text_pairs
         }
 
-    def _get_text_description_for_time(self, t):
-        # Find the annotation that covers the time t and return its label/action
-        for ann in self.annotations:
-            if ann['start_time'] <= t <= ann['end_time']:
-                return ann['action']
-        return ""
+    def _get_text_descriptions_for_times(self, times):
+        # For each time t, the first annotation that covers it gives its label/action
+        from utils.segment_index import SegmentIndex
+        return SegmentIndex.from_segments(self.segments).get_labels(times)
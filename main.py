@@ -1,74 +1,217 @@
 import os
-import shutil
-import argparse
-import random
-import string
 import json
-
+import pickle
+import hashlib
+import argparse
+import traceback
+from functools import partial
+from itertools import repeat
+
+from utils.annotation_store import AnnotationStore
+from utils.atomic_file import atomic_open
+from utils.build_manifest import BuildManifest
+from utils.clip_trimmer import ClipTrimmer
 from utils.csv_reader import ViaCSVReader
+from utils.external_grouper import ExternalGrouper
+from utils.folder_watcher import FolderWatcher
+from utils.json_stream import JSONStreamWriter
+from utils.probe_cache import ProbeCache
+from utils.stage_profiler import StageProfiler
 from utils.video_extractor import VideoExtractor
 from utils.video_processor import VideoProcessor
+from utils.video_registry import VideoRegistry
+from utils.video_stager import VideoStager
+from utils.view_index import ViewIndex
+from utils.pipeline import (FORMATS, TARGET_FOLDER, build_sushi_annotations, export_activitynet, export_kinetics,
+                            export_nuylsushi, get_manifest_key, parse_formats, probe_videos, run_exporters,
+                            save_frames, stage_annotation)
 
 from formats.activitynet.annotation import ActivityNetAnnotation
-from formats.nuyl_sushi.annotation import NUYLSushiAnnotation
-
-from parsers.basic_parser import BaseParser
-from parsers.activitynet_parser import ActivityNetParser
-from parsers.kinectics_parser import KineticsParser
-
-
-def _generate_next_video_id(target_folder):
-    if not os.path.exists(target_folder):
-        os.makedirs(target_folder)
-
-    existing_ids = set(os.listdir(target_folder))
-    while True:
-        new_id = ''.join(random.choices(
-            string.ascii_letters + string.digits, k=11))
-        if new_id not in existing_ids:
-            return new_id
-
-
-def _copy_and_rename_video(filename, source_folder, target_folder="./dataset/encode_videos", log_file="./dataset/filename_log.txt"):
-    source_path = os.path.normpath(os.path.join(
-        source_folder, os.path.basename(filename)))
 
-    if not os.path.exists(target_folder):
-        os.makedirs(target_folder)
 
-    video_id = _generate_next_video_id(target_folder)
-    target_path = os.path.normpath(os.path.join(
-        target_folder, f"{video_id}.mp4"))
-
-    if os.path.exists(source_path):
-        shutil.copy(source_path, target_path)
-        print(f"Video copied and renamed to {target_path}")
-
-        with open(log_file, 'a') as log:
-            log.write(f"Original: {filename}, New: {target_path}\n")
-
-    return target_path
+def _in_shard(filename, shard):
+    """
+    Tells whether a video belongs to shard (index, count). The choice only depends on the source filename,
+    so every node agrees on it without coordination.
+    """
+    index, count = shard
+    digest = hashlib.sha1(filename.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count == index
 
 
-def _get_view(filename):
-    video_filenames_path = 'video_filenames.json'
+def _fingerprint_annotations(annotations):
+    """
+    Hashes the VIA annotation set, so shards of different CSV exports are never merged together.
+    """
+    digest = hashlib.sha256()
+    for annotation in annotations:
+        digest.update(json.dumps(annotation.to_dict()).encode('utf-8'))
+    return digest.hexdigest()
 
-    # Initialize video_filenames dictionary with both views
-    video_filenames = {"front_view": [], "side_view": []}
 
-    # Load the current video filenames from JSON if it exists
-    if os.path.exists(video_filenames_path):
-        with open(video_filenames_path, 'r') as file:
-            video_filenames = json.load(file)
+def _get_shard_part_file(output_folder, shard):
+    index, count = shard
+    return os.path.join(output_folder, 'shards', f"part-{index:04d}-of-{count:04d}.pickle")
 
-    # Determine the view based on whether the filename is in side_view
-    view = 'side_view' if filename in video_filenames.get(
-        'side_view', []) else 'front_view'
 
-    return view
+def _get_shard_manifest_file(manifest_file, shard):
+    # Shards running side by side must not overwrite each other's manifest, as each one only holds its videos
+    root, ext = os.path.splitext(manifest_file)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
 
 
-def main(csv_folder: str, video_folder: str, output_folder):
+def _save_shard_part(output_folder, shard, total, fingerprint, formats, entries, skipped=0):
+    """
+    Saves the staged annotations of a shard, each with its position in the whole annotation set and its
+    NUYLSushi entry, for scripts/merge_shards.py to build the final outputs from.
+    """
+    part_file = _get_shard_part_file(output_folder, shard)
+    os.makedirs(os.path.dirname(part_file), exist_ok=True)
+    with atomic_open(part_file, 'wb') as file:
+        pickle.dump({
+            'shard': list(shard),
+            'videos': total,
+            'fingerprint': fingerprint,
+            'formats': list(formats or FORMATS),
+            'entries': entries,
+            'skipped': skipped
+        }, file, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Shard {shard[0]}/{shard[1]}: {len(entries)} of {total} videos written to {part_file}")
+
+
+def _build_annotation(rows):
+    """
+    Builds the annotation of one video from its VIA rows, the way AnnotationStore.add_row does.
+    """
+    parent_label, filename, label, coordinates = rows[0]
+    annotation = ActivityNetAnnotation(
+        parent_label, filename, label, coordinates, None)
+    for _, _, label, coordinates in rows[1:]:
+        annotation.add_annotation(coordinates, label)
+    return annotation
+
+
+def _read_spilled_annotations(spill_file):
+    with open(spill_file, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+def _main_out_of_core(csv_folder, video_folder, output_folder, probe_cache, registry, video_processor, profiler,
+                      workers, stage_mode, trim_clips, json_backend, formats, view_index_file, view_rules,
+                      max_rows_in_memory, spill_folder):
+    """
+    Builds the outputs without holding every VIA row in memory. The rows are grouped per video by an external
+    sort, the videos are probed in batches, and the staged annotations are spilled to disk once and streamed
+    to each exporter, which only keep the class counts and label sets of the project in memory.
+    """
+    batch_size = max(1, min(256, max_rows_in_memory))
+    grouper = ExternalGrouper(max_rows_in_memory, spill_folder)
+    try:
+        with profiler.stage('read_csv') as stage:
+            for row in ViaCSVReader(csv_folder, workers):
+                grouper.add(row)
+                stage.items += 1
+
+        with profiler.stage('probe') as stage:
+            batch = []
+            for filename, _ in grouper.groups():
+                stage.items += 1
+                batch.append(filename)
+                if len(batch) >= batch_size:
+                    probe_videos(batch, video_folder, probe_cache, workers)
+                    batch = []
+            probe_videos(batch, video_folder, probe_cache, workers)
+
+        summary = {'videos': 0, 'basenames': 0, 'label_sets': {}, 'coarse_counts': {},
+                   'fine_counts': {}, 'extra_segments': {}}
+        seen_basenames = set()
+        spill_file = os.path.join(grouper.spill_folder, 'annotations.pickle')
+        with profiler.stage('stage', [TARGET_FOLDER]) as stage:
+            stager = VideoStager(TARGET_FOLDER, stage_mode, registry)
+            view_index = ViewIndex(view_index_file, rules=view_rules)
+            with open(spill_file, 'wb') as file:
+                for filename, rows in grouper.groups():
+                    annotation = _build_annotation(rows)
+                    annotation.set_video_info(VideoExtractor(
+                        video_folder, filename, probe_cache).get_info())
+                    if not stage_annotation(annotation, stager, view_index,
+                                             probe_cache, video_folder):
+                        continue
+                    pickle.dump(annotation, file,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+
+                    labels = annotation.segments.labels()
+                    summary['videos'] += 1
+                    summary['label_sets'].setdefault(
+                        annotation.label, set()).update(labels)
+                    coarse_counts = summary['coarse_counts']
+                    coarse_counts[annotation.label] = coarse_counts.get(
+                        annotation.label, 0) + 1
+                    # Fine classes are counted per segment, like KineticsParser counts them in memory
+                    fine_counts = summary['fine_counts']
+                    for label in labels:
+                        fine_counts[label] = fine_counts.get(label, 0) + 1
+
+                    # ActivityNet merges videos sharing a basename into the first one
+                    basename, _ = os.path.splitext(annotation.filename)
+                    if basename in seen_basenames:
+                        summary['extra_segments'].setdefault(basename, []).append(
+                            next(iter(annotation.segments)))
+                    else:
+                        seen_basenames.add(basename)
+            summary['basenames'] = len(seen_basenames)
+            stager.save()
+            stage.items = summary['videos']
+
+        if summary['videos'] > 0:
+            exporters = {
+                'activitynet': partial(export_activitynet, output_folder, _read_spilled_annotations(spill_file),
+                                       json_backend, profiler, summary),
+                'kinetics': partial(export_kinetics, output_folder, _read_spilled_annotations(spill_file),
+                                    TARGET_FOLDER, stage_mode in ('auto', 'hardlink'), trim_clips, profiler,
+                                    summary),
+                'nuylsushi': partial(export_nuylsushi, output_folder, _read_spilled_annotations(spill_file),
+                                     video_processor, None, json_backend, profiler, summary, batch_size)
+            }
+            run_exporters([(name, exporters[name]) for name in FORMATS
+                            if name in (formats or FORMATS)], profiler)
+        else:
+            print("No annotation data found or an error occurred.")
+    finally:
+        grouper.close()
+
+
+def _parse_view_rule(value):
+    pattern, separator, view = value.rpartition('=')
+    if not separator or not pattern or not view:
+        raise argparse.ArgumentTypeError(
+            f"Invalid view rule '{value}', expected PATTERN=VIEW")
+    return pattern, view
+
+
+def _parse_shard(value):
+    index, separator, count = value.partition('/')
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        shard = None
+    if not separator or shard is None or not 0 <= shard[0] < shard[1]:
+        raise argparse.ArgumentTypeError(
+            f"Invalid shard '{value}', expected I/N with 0 <= I < N")
+    return shard
+
+
+def main(csv_folder: str, video_folder: str, output_folder, probe_cache_file: str = './dataset/probe_cache.json', workers: int = 1, stage_mode: str = 'auto', trim_clips: str = None, extract_frames: bool = True,
+         frame_output: str = 'jpeg', shard_size: tuple = None, json_backend: str = 'json',
+         manifest_file: str = './dataset/build_manifest.json', full_rebuild: bool = False,
+         profile_file: str = None, profile_stage: str = None, formats: tuple = None,
+         view_index_file: str = 'video_filenames.json', view_rules: list = None,
+         registry_file: str = './dataset/registry.sqlite', max_rows_in_memory: int = None,
+         spill_folder: str = None, shard: tuple = None):
     """
     This is the main function that orchestrates the process of reading CSV files from VIA Annotation Tool,
     extracting video information, creating annotations, parsing the data into the specified format,
@@ -79,60 +222,134 @@ def main(csv_folder: str, video_folder: str, output_folder):
     video_folder (str): The path to the folder containing the video files.
     output_filepath (str): The path to the output file.
     parser_type (str): The type of parser to use ('activitynet' or 'basic').
+    probe_cache_file (str): The path to the on-disk video probe cache.
+    workers (int): The number of processes used to read CSV files and probe videos.
+    stage_mode (str): How videos are staged into the encode folder ('auto', 'hardlink', 'reflink', 'symlink' or 'copy').
+    trim_clips (str): If set ('copy' or 'encode'), fine segments are also trimmed into their own Kinetics clips.
+    extract_frames (bool): Whether the sampled NUYLSushi frames are saved as images.
+    frame_output (str): Whether sampled frames are saved as JPEGs ('jpeg') or one .npy shard per video ('shard').
+    shard_size (tuple): Optional (width, height) the frames of a shard are resized to.
+    json_backend (str): The JSON encoder used for the outputs ('json' or 'simplejson').
+    manifest_file (str): The path to the build manifest used for incremental rebuilds.
+    full_rebuild (bool): Whether to ignore the build manifest and rebuild every video.
+    profile_file (str): If set, the path of a JSON report with the time, memory and I/O of every stage.
+    profile_stage (str): A stage that is also run under cProfile, next to the profile report.
+    formats (tuple): The outputs to build ('activitynet', 'kinetics', 'nuylsushi'), all of them by default.
+    view_index_file (str): The path to the index of front and side view videos.
+    view_rules (list): (glob pattern, view) rules for videos that are not listed in the view index.
+    registry_file (str): The path to the SQLite registry of source videos, video IDs, staged paths and frame stats.
+    max_rows_in_memory (int): If set, VIA rows are grouped out of core, spilling runs of this many rows to disk.
+        The build manifest is not used in this mode.
+    spill_folder (str): The folder the out-of-core runs are spilled to, the system temp folder by default.
+    shard (tuple): If set, (index, count): only the videos of this shard are probed, staged and sampled, and a
+        part file is written to output_folder/shards instead of the outputs. See scripts/merge_shards.py.
+        Each shard keeps its own build manifest next to manifest_file.
     """
 
-    annotations = []
-
-    for parent_label, filename, label, coordinates in ViaCSVReader(csv_folder):
-
-        annotation = next(
-            (anno for anno in annotations if anno.filename == filename), None)
-
-        if parent_label == '1_CUTTING-SALMON':
-            print("Found")
-
-        if annotation is None:
-            video_extractor = VideoExtractor(video_folder, filename)
-            video_info = video_extractor.get_info()
-            annotations.append(ActivityNetAnnotation(
-                parent_label, filename, label, coordinates, video_info))
-        else:
-            annotation.add_annotation(coordinates, label)
-
-    target_folder = './dataset/encode_videos'
-    for annotation in annotations:
-        copied_path = _copy_and_rename_video(
-            annotation.filename, video_folder, target_folder)
-        annotation.url = copied_path
-        annotation.view = _get_view(
-            annotation.filename)
-        annotation.filename = os.path.basename(copied_path)
-
-    if len(annotations) > 0:
-        activitynet_path = output_folder + '/activitynet/annotations.json'
-        kinectics_path = output_folder + '/kinetics/'
-        nuylsushi_path = output_folder + '/nuylsushi/annotations.json'
-
-        # ActivityNet
-        parser = ActivityNetParser(activitynet_path, annotations)
-        parser.write_json_data()
-
-        # Kinetics
-        parser = KineticsParser(kinectics_path, annotations, target_folder)
-        parser.save_annotation()
-
-        # NUYLSushi
-        video_processor = VideoProcessor()
-        sushi_annotations = []
+    annotations = AnnotationStore()
+    probe_cache = ProbeCache(probe_cache_file)
+    registry = VideoRegistry(registry_file)
+    video_processor = VideoProcessor(
+        registry=registry, cache=probe_cache, extract_frames=extract_frames, workers=workers,
+        output=frame_output, shard_size=shard_size)
+    profiler = StageProfiler(profile_file, profile_stage)
+
+    if max_rows_in_memory:
+        _main_out_of_core(csv_folder, video_folder, output_folder, probe_cache, registry, video_processor,
+                          profiler, workers, stage_mode, trim_clips, json_backend, formats, view_index_file,
+                          view_rules, max_rows_in_memory, spill_folder)
+        probe_cache.save()
+        registry.close()
+        profiler.save()
+        return
+
+    if shard is not None:
+        manifest_file = _get_shard_manifest_file(manifest_file, shard)
+    manifest = BuildManifest(manifest_file, {
+        'images_folder': video_processor.images_folder,
+        'fps': video_processor.fps,
+        'extract_frames': extract_frames,
+        'frame_output': frame_output,
+        'shard_size': list(shard_size) if shard_size else None
+    }, reuse=not full_rebuild)
+
+    # The manifest holds the parsed rows of every CSV anyway, so listing them first costs only references
+    with profiler.stage('read_csv') as stage:
+        rows = list(ViaCSVReader(csv_folder, workers, manifest))
+        stage.items = len(rows)
+
+    with profiler.stage('group') as stage:
+        for parent_label, filename, label, coordinates in rows:
+
+            if parent_label == '1_CUTTING-SALMON':
+                print("Found")
+
+            annotations.add_row(parent_label, filename, label, coordinates)
+        del rows
+        stage.items = len(annotations)
+
+    if shard is not None:
+        # Every shard reads all CSVs, so it knows where its videos sit in the whole annotation set
+        total = len(annotations)
+        fingerprint = _fingerprint_annotations(annotations)
+        positions = {annotation.filename: index for index,
+                     annotation in enumerate(annotations)}
+        annotations = AnnotationStore([annotation for annotation in annotations
+                                       if _in_shard(annotation.filename, shard)])
+        positions = [positions[annotation.filename]
+                     for annotation in annotations]
+
+    with profiler.stage('probe') as stage:
+        video_infos = probe_videos(
+            annotations.filenames(), video_folder, probe_cache, workers)
         for annotation in annotations:
-            sushi_annotations.append(
-                NUYLSushiAnnotation(annotation, video_processor))
+            annotation.set_video_info(video_infos[annotation.filename])
+        stage.items = len(video_infos)
+
+    with profiler.stage('stage', [TARGET_FOLDER]) as stage:
+        stager = VideoStager(TARGET_FOLDER, stage_mode, registry)
+        view_index = ViewIndex(view_index_file, rules=view_rules)
+        is_staged = [stage_annotation(annotation, stager, view_index, probe_cache, video_folder)
+                     for annotation in annotations]
+        if shard is not None:
+            positions = [position for position,
+                         staged in zip(positions, is_staged) if staged]
+        annotations = AnnotationStore([annotation for annotation, staged in zip(annotations, is_staged)
+                                       if staged])
+        stager.save()
+        stage.items = len(annotations)
 
-        parser = BaseParser(nuylsushi_path)
-        parser.save_annotation(sushi_annotations)
+    for annotation in annotations:
+        manifest.add_video(get_manifest_key(annotation), annotation.to_dict())
+
+    if shard is not None:
+        sushi_entries = repeat(None)
+        if 'nuylsushi' in (formats or FORMATS):
+            with profiler.stage('nuylsushi') as stage:
+                sushi_entries = [entry if isinstance(entry, dict) else entry.to_dict()
+                                 for entry in build_sushi_annotations(annotations, video_processor, manifest)]
+                stage.items = len(sushi_entries)
+            save_frames(video_processor, profiler)
+        _save_shard_part(output_folder, shard, total, fingerprint, formats,
+                         list(zip(positions, annotations, sushi_entries)), stager.missing)
+    elif len(annotations) > 0:
+        exporters = {
+            'activitynet': partial(export_activitynet, output_folder, annotations, json_backend, profiler),
+            'kinetics': partial(export_kinetics, output_folder, annotations, TARGET_FOLDER,
+                                stage_mode in ('auto', 'hardlink'), trim_clips, profiler),
+            'nuylsushi': partial(export_nuylsushi, output_folder, annotations, video_processor,
+                                 manifest, json_backend, profiler)
+        }
+        run_exporters([(name, exporters[name]) for name in FORMATS
+                        if name in (formats or FORMATS)], profiler)
     else:
         print("No annotation data found or an error occurred.")
 
+    probe_cache.save()
+    manifest.save()
+    registry.close()
+    profiler.save()
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -142,8 +359,83 @@ if __name__ == '__main__':
                         help='Path to the folder containing video files.')
     parser.add_argument('--output-folder', default='./output',
                         help='Path to the folder for storing output files.')
+    parser.add_argument('--probe-cache', default='./dataset/probe_cache.json',
+                        help='Path to the video probe cache file.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used to read CSV files and probe videos.')
+    parser.add_argument('--stage-mode', default='auto', choices=VideoStager.MODES,
+                        help='How videos are staged into the encode folder.')
+    parser.add_argument('--trim-clips', default=None, choices=ClipTrimmer.MODES,
+                        help='Also trim fine segments into Kinetics clips by stream copy or re-encode.')
+    parser.add_argument('--extract-frames', default=True, action=argparse.BooleanOptionalAction,
+                        help='Save the sampled NUYLSushi frames as images.')
+    parser.add_argument('--frame-output', default='jpeg', choices=VideoProcessor.OUTPUTS,
+                        help='Save sampled frames as JPEG files or as one .npy shard per video.')
+    parser.add_argument('--frame-shard-size', default=None, type=lambda value: tuple(int(v) for v in value.split('x')),
+                        help='Resize the frames of --frame-output shard to WIDTHxHEIGHT.')
+    parser.add_argument('--json-backend', default='json', choices=JSONStreamWriter.BACKENDS,
+                        help='JSON encoder for the outputs; simplejson is used only if installed.')
+    parser.add_argument('--manifest', default='./dataset/build_manifest.json',
+                        help='Path to the build manifest used for incremental rebuilds.')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='Ignore the build manifest and rebuild every video.')
+    parser.add_argument('--formats', default=FORMATS, type=parse_formats,
+                        help=f"Comma-separated outputs to build, by default {','.join(FORMATS)}.")
+    parser.add_argument('--view-index', default='video_filenames.json',
+                        help='Path to the index of front and side view videos.')
+    parser.add_argument('--view-rule', dest='view_rules', action='append', type=_parse_view_rule, default=None,
+                        metavar='PATTERN=VIEW', help='View of unlisted videos whose filename matches PATTERN. Repeatable.')
+    parser.add_argument('--registry', default='./dataset/registry.sqlite',
+                        help='Path to the SQLite registry of staged videos.')
+    parser.add_argument('--profile', default=None, metavar='REPORT',
+                        help='Write a JSON report with the time, memory and I/O of every stage to REPORT.')
+    parser.add_argument('--profile-stage', default=None, choices=StageProfiler.STAGES,
+                        help='Also run this stage under cProfile; the stats are saved next to the report.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and update the outputs whenever CSV or video files change.')
+    parser.add_argument('--watch-interval', type=float, default=2.0,
+                        help='Seconds between two polls of the watched folders.')
+    parser.add_argument('--debounce', type=float, default=5.0,
+                        help='Seconds the watched folders must be quiet before an update starts.')
+    parser.add_argument('--max-rows-in-memory', type=int, default=None, metavar='N',
+                        help='Group VIA rows out of core, spilling sorted runs of N rows to disk.')
+    parser.add_argument('--spill-folder', default=None,
+                        help='Folder for the out-of-core runs, the system temp folder by default.')
+    parser.add_argument('--shard', default=None, type=_parse_shard, metavar='I/N',
+                        help='Only process shard I of N (0-based) and write a part file for scripts/merge_shards.py.')
 
     args = parser.parse_args()
-
-    main(args.csv_folder, args.video_folder,
-         args.output_folder)
+    if args.shard is not None and args.max_rows_in_memory:
+        parser.error('--shard cannot be combined with --max-rows-in-memory')
+
+    def run(full_rebuild):
+        main(args.csv_folder, args.video_folder,
+             args.output_folder, args.probe_cache, args.workers, args.stage_mode, args.trim_clips, args.extract_frames,
+             args.frame_output, args.frame_shard_size, args.json_backend,
+             args.manifest, full_rebuild, args.profile, args.profile_stage, args.formats,
+             args.view_index, args.view_rules, args.registry, args.max_rows_in_memory, args.spill_folder,
+             args.shard)
+
+    def update(full_rebuild):
+        # One failed update must not stop the watcher; the next change triggers another attempt
+        try:
+            run(full_rebuild)
+        except Exception:
+            traceback.print_exc()
+            print("Error: the update failed, the outputs are updated again on the next change")
+
+    # Snapshot the folders before the first run, so files landing during it trigger an update
+    watcher = FolderWatcher([args.csv_folder, args.video_folder],
+                            args.watch_interval, args.debounce) if args.watch else None
+    if watcher is None:
+        run(args.full_rebuild)
+    else:
+        try:
+            update(args.full_rebuild)
+            print(f"Watching {args.csv_folder} and {args.video_folder} for changes")
+            for changes in watcher.watch():
+                print(f"{len(changes)} changed files, updating outputs")
+                # The build manifest limits the update to the changed CSVs and videos
+                update(False)
+        except KeyboardInterrupt:
+            print("Stopped watching")
@@ -1,7 +1,11 @@
+import copy
 import os
-import jsonpickle
 
 from formats.activitynet.taxonomy import Taxonomy
+from utils.atomic_file import atomic_open
+from utils.console import echo
+from utils.annotation_store import AnnotationStore
+from utils.json_stream import JSONStreamWriter, StreamArray, StreamObject
 
 
 class ActivityNetParser:
@@ -15,25 +19,59 @@ class ActivityNetParser:
     This parser allows for the inclusion of additional metadata and custom processing of annotations, making the output more versatile for different applications.
     """
 
-    def __init__(self, output_file: str, data):
+    def __init__(self, output_file: str, data, json_backend: str = 'json', label_sets: dict = None,
+                 extra_segments: dict = None, taxonomy: list = None):
+        """
+        data is an AnnotationStore (or a list of annotations). To stream annotations that don't fit in memory,
+        pass an iterable of annotations together with the label sets of the whole project and, per basename,
+        the first segments of its duplicates. A taxonomy already built from the same data can be passed in.
+        """
         self.output_file = output_file
+        self.json_backend = json_backend
         self.annotation = {
             'database': {},
             'version': 'VERSION 1.0',
             'taxonomy': []
         }
-        self.taxonomy = Taxonomy(data).get()
+        if label_sets is not None:
+            self.taxonomy = taxonomy if taxonomy is not None else Taxonomy(label_sets).get()
+            self.annotation['database'] = self._stream_annotation(
+                data, extra_segments or {})
+            return
+        if not isinstance(data, AnnotationStore):
+            data = AnnotationStore(data)
+        self.taxonomy = taxonomy if taxonomy is not None else Taxonomy(data).get()
         self._parse_annotation(data)
 
-    def _parse_annotation(self, data):
+    def _merge(self, item, segments):
+        # Merge into a copy, the annotations are shared read-only with the other exporters
+        item = copy.copy(item)
+        item.segments = item.segments.copy()
+        for start, end, label in segments:
+            item.add_annotation([start, end], label)
+        return item
+
+    def _parse_annotation(self, data: AnnotationStore):
+        for basename in data.basenames():
+            item, *duplicates = data.get_by_basename(basename)
+            if duplicates:
+                item = self._merge(item, [next(iter(duplicate.segments))
+                                          for duplicate in duplicates])
+            self.annotation['database'][basename] = item
+
+    def _stream_annotation(self, data, extra_segments):
+        """
+        Yields (basename, item) for each annotation, skipping duplicates of a basename already yielded.
+        """
+        seen = set()
         for item in data:
             basename, _ = os.path.splitext(item.filename)
-
-            if basename in self.annotation['database']:
-                self.annotation['database'][basename].annotations.append(
-                    item.annotations[0])
-            else:
-                self.annotation['database'][basename] = item
+            if basename in seen:
+                continue
+            seen.add(basename)
+            if basename in extra_segments:
+                item = self._merge(item, extra_segments[basename])
+            yield basename, item
 
     def _get_taxonomy_filename(self):
         dirname, basename = os.path.split(self.output_file)
@@ -42,18 +80,23 @@ class ActivityNetParser:
 
     def _write_json_file(self, filename, data):
         try:
-            with open(filename, "w") as json_file:
-                json_data = jsonpickle.encode(
-                    data, unpicklable=False, make_refs=False)
-                json_file.write(json_data)
-            print(f"JSON data written to {filename}")
+            with atomic_open(filename) as json_file:
+                JSONStreamWriter(json_file, self.json_backend).write(data)
+            echo(f"JSON data written to {filename}")
         except Exception as e:
-            print(f"Error writing JSON data: {str(e)}")
+            echo(f"Error writing JSON data: {str(e)}")
 
     def write_json_data(self):
         folder_path, _ = os.path.split(self.output_file)
         os.makedirs(folder_path, exist_ok=True)
 
-        self._write_json_file(self.output_file, self.annotation)
+        # Videos are serialized one at a time instead of as one document string
+        items = self.annotation['database']
+        if isinstance(items, dict):
+            items = items.items()
+        database = StreamObject((basename, item.to_dict())
+                                for basename, item in items)
+        self._write_json_file(self.output_file, StreamObject(
+            [('database', database)] + [(key, value) for key, value in self.annotation.items() if key != 'database']))
         taxonomy_name = self._get_taxonomy_filename()
-        self._write_json_file(taxonomy_name, self.taxonomy)
+        self._write_json_file(taxonomy_name, StreamArray(self.taxonomy))
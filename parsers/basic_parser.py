@@ -1,5 +1,8 @@
 import os
-import jsonpickle
+
+from utils.atomic_file import atomic_open
+from utils.console import echo
+from utils.json_stream import JSONStreamWriter, StreamArray, StreamObject
 
 
 class BaseParser:
@@ -8,29 +11,29 @@ class BaseParser:
     It includes methods to write data into a JSON file.
     """
 
-    def __init__(self, output_file: str):
+    def __init__(self, output_file: str, json_backend: str = 'json'):
         self.output_file = output_file
+        self.json_backend = json_backend
 
     def _write_json_file(self, filename, data):
         """
-        Writes the given data into a JSON file specified by filename.
+        Writes the given data into a JSON file specified by filename, streaming StreamObject/StreamArray values item by item.
         """
         try:
-            with open(filename, "w") as json_file:
-                json_data = jsonpickle.encode(
-                    data, unpicklable=False, make_refs=False)
-                json_file.write(json_data)
-            print(f"JSON data written to {filename}")
+            with atomic_open(filename) as json_file:
+                JSONStreamWriter(json_file, self.json_backend).write(data)
+            echo(f"JSON data written to {filename}")
         except Exception as e:
-            print(f"Error writing JSON data: {str(e)}")
+            echo(f"Error writing JSON data: {str(e)}")
 
     def save_annotation(self, data):
         """
-        Saves the annotation data into the output file.
+        Saves the annotation data into the output file. data may be any iterable, e.g. a generator
+        that creates one video's annotation at a time; each video is serialized as soon as it is produced.
         """
-        annotation_data = {
-            "videos": data
-        }
+        annotation_data = StreamObject([
+            ("videos", StreamArray(data))
+        ])
         folder_path, _ = os.path.split(self.output_file)
         os.makedirs(folder_path, exist_ok=True)
         self._write_json_file(self.output_file, annotation_data)
@@ -1,10 +1,29 @@
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.annotation_store import AnnotationStore
+from utils.atomic_file import atomic_open
+from utils.clip_trimmer import ClipTrimmer
+from utils.console import echo
 
 
 class KineticsParser:
-    def __init__(self, output_folder: str, data: list = None, source_folder: str = "./source_videos") -> None:
+    def __init__(self, output_folder: str, data: AnnotationStore = None, source_folder: str = "./source_videos",
+                 workers: int = 8, link: bool = False, trim: str = None, summary: dict = None) -> None:
+        """
+        data is an AnnotationStore (or a list of annotations). Given a summary of the whole project, the number of
+        videos and the coarse_counts and fine_counts of its classes, data may instead be any iterable that is
+        read once, e.g. a generator streaming annotations that don't fit in memory.
+        """
         self.output_folder = output_folder
+        self.workers = workers
+        self.link = link
+        self.trim = trim
+        self.summary = summary
+        if data is not None and summary is None and not isinstance(data, AnnotationStore):
+            data = AnnotationStore(data)
         self.data = data
         self.source_folder = source_folder
         # Define new paths for coarse and fine class folders and list files
@@ -30,6 +49,16 @@ class KineticsParser:
         self.fine_seg_val_list_path = os.path.join(
             output_folder, "nuylsushi/nuylsushi_fine_seg_val_list_videos.txt")
 
+        # Trimmed fine segment clips, only written when trim is set
+        self.fine_clip_train_folder = os.path.join(
+            output_folder, "nuylsushi/fine/clips_train")
+        self.fine_clip_val_folder = os.path.join(
+            output_folder, "nuylsushi/fine/clips_val")
+        self.fine_clip_train_list_path = os.path.join(
+            output_folder, "nuylsushi/nuylsushi_fine_clip_train_list_videos.txt")
+        self.fine_clip_val_list_path = os.path.join(
+            output_folder, "nuylsushi/nuylsushi_fine_clip_val_list_videos.txt")
+
         # Ensure all folders exist
         os.makedirs(self.coarse_train_folder, exist_ok=True)
         os.makedirs(self.coarse_val_folder, exist_ok=True)
@@ -41,19 +70,25 @@ class KineticsParser:
         Generates dictionaries mapping class names to unique numbers for both coarse and fine classes,
         and also counts the occurrences of each class.
         """
-        coarse_class_set = set()
+        if self.summary is not None:
+            coarse_class_count = dict(self.summary['coarse_counts'])
+            fine_class_count = dict(self.summary['fine_counts'])
+            coarse_class_list = {classname: index for index,
+                                 classname in enumerate(sorted(coarse_class_count))}
+            fine_class_list = {classname: index for index,
+                               classname in enumerate(sorted(fine_class_count))}
+            return coarse_class_list, fine_class_list, coarse_class_count, fine_class_count
+
+        coarse_class_set = set(self.data.labels())
         fine_class_set = set()
-        coarse_class_count = {}
+        coarse_class_count = {label: len(self.data.get_by_label(label))
+                              for label in self.data.labels()}
         fine_class_count = {}
 
         for annotation in self.data:
-            coarse_class_set.add(annotation.label)
-            coarse_class_count[annotation.label] = coarse_class_count.get(
-                annotation.label, 0) + 1
-            for ann in annotation.annotations:
-                fine_class_set.add(ann['label'])
-                fine_class_count[ann['label']] = fine_class_count.get(
-                    ann['label'], 0) + 1
+            for label in annotation.segments.labels():
+                fine_class_set.add(label)
+                fine_class_count[label] = fine_class_count.get(label, 0) + 1
 
         coarse_class_list = {classname: index for index,
                              classname in enumerate(sorted(coarse_class_set))}
@@ -67,7 +102,7 @@ class KineticsParser:
         Saves the counts of each coarse and fine class to a log file.
         """
         log_path = os.path.join(self.output_folder, "class_counts_log.txt")
-        with open(log_path, "w") as log_file:
+        with atomic_open(log_path) as log_file:
             log_file.write("Coarse Class Counts:\n")
             for classname, count in sorted(coarse_class_count.items()):
                 log_file.write(f"{classname}: {count}\n")
@@ -81,14 +116,19 @@ class KineticsParser:
         Adjusts for both training and validation data based on a split ratio.
         """
         # Calculate split index
-        split_index = int(len(self.data) * split_ratio)
+        split_index = int(self._count() * split_ratio)
+        # Copies are planned per destination as the videos stream by, so the plan grows with the videos, not
+        # the segments. Clip requests are only collected when clips are trimmed.
+        copy_plan = {}
+        request_counts = {}
+        clip_requests = []
 
-        with open(self.coarse_train_list_path, "w") as coarse_train_file, \
-                open(self.fine_train_list_path, "w") as fine_train_file, \
-                open(self.coarse_val_list_path, "w") as coarse_val_file, \
-                open(self.fine_val_list_path, "w") as fine_val_file, \
-                open(self.fine_seg_train_list_path, "w") as fine_seg_train_file, \
-                open(self.fine_seg_val_list_path, "w") as fine_seg_val_file:
+        with atomic_open(self.coarse_train_list_path) as coarse_train_file, \
+                atomic_open(self.fine_train_list_path) as fine_train_file, \
+                atomic_open(self.coarse_val_list_path) as coarse_val_file, \
+                atomic_open(self.fine_val_list_path) as fine_val_file, \
+                atomic_open(self.fine_seg_train_list_path) as fine_seg_train_file, \
+                atomic_open(self.fine_seg_val_list_path) as fine_seg_val_file:
 
             for i, annotation in enumerate(self.data):
                 coarse_class_number = coarse_class_list[annotation.label]
@@ -96,39 +136,138 @@ class KineticsParser:
                     self.source_folder, annotation.filename)
 
                 if i < split_index:  # Training data
-                    shutil.copy(src_file_path, self.coarse_train_folder)
+                    self._add_copy_request(
+                        copy_plan, request_counts, src_file_path, self.coarse_train_folder)
                     coarse_train_file.write(f"{annotation.filename} {
                                             coarse_class_number}\n")
-                    for ann in annotation.annotations:
-                        fine_class_number = fine_class_list[ann['label']]
-                        start_time, end_time = ann['segment']
-                        shutil.copy(src_file_path, self.fine_train_folder)
+                    for start_time, end_time, label in annotation.segments:
+                        fine_class_number = fine_class_list[label]
+                        self._add_copy_request(
+                            copy_plan, request_counts, src_file_path, self.fine_train_folder)
+                        if self.trim:
+                            clip_requests.append(self._get_clip_request(
+                                src_file_path, self.fine_clip_train_folder, start_time, end_time, fine_class_number))
 
                         fine_train_file.write(f"{annotation.filename} {
                                               fine_class_number}\n")
                         fine_seg_train_file.write(f"{annotation.filename} {start_time} {
                             end_time} {fine_class_number}\n")
                 else:  # Validation data
-                    shutil.copy(src_file_path, self.coarse_val_folder)
+                    self._add_copy_request(
+                        copy_plan, request_counts, src_file_path, self.coarse_val_folder)
                     coarse_val_file.write(f"{annotation.filename} {
                         coarse_class_number}\n")
-                    for ann in annotation.annotations:
-                        fine_class_number = fine_class_list[ann['label']]
-                        start_time, end_time = ann['segment']
-                        shutil.copy(src_file_path, self.fine_val_folder)
+                    for start_time, end_time, label in annotation.segments:
+                        fine_class_number = fine_class_list[label]
+                        self._add_copy_request(
+                            copy_plan, request_counts, src_file_path, self.fine_val_folder)
+                        if self.trim:
+                            clip_requests.append(self._get_clip_request(
+                                src_file_path, self.fine_clip_val_folder, start_time, end_time, fine_class_number))
 
                         fine_val_file.write(f"{annotation.filename} {
                                             fine_class_number}\n")
                         fine_seg_val_file.write(f"{annotation.filename} {start_time} {
                             end_time} {fine_class_number}\n")
 
+        self._materialize_videos(copy_plan, request_counts)
+        if self.trim:
+            self._save_clip_lists(clip_requests)
+
+    def _add_copy_request(self, copy_plan, request_counts, src_file_path, folder):
+        dest_file_path = os.path.join(folder, os.path.basename(src_file_path))
+        copy_plan.setdefault(dest_file_path, src_file_path)
+        request_counts[src_file_path] = request_counts.get(src_file_path, 0) + 1
+
+    def _count(self):
+        if self.summary is not None:
+            return self.summary['videos']
+        return len(self.data)
+
+    def _get_clip_request(self, src_file_path, folder, start_time, end_time, fine_class_number):
+        basename, _ = os.path.splitext(os.path.basename(src_file_path))
+        clip_path = os.path.join(
+            folder, f"{basename}_{start_time}_{end_time}.mp4")
+        return src_file_path, clip_path, start_time, end_time, fine_class_number
+
+    def _save_clip_lists(self, clip_requests):
+        """
+        Trims every fine segment into its own clip and saves fine lists that point at the clips.
+        """
+        clips = {}
+        for src_file_path, clip_path, start_time, end_time, _ in clip_requests:
+            clips.setdefault(
+                clip_path, (src_file_path, clip_path, start_time, end_time))
+        trimmed = dict(zip(clips, ClipTrimmer(
+            self.trim, self.workers).trim(list(clips.values()))))
+
+        with atomic_open(self.fine_clip_train_list_path) as fine_clip_train_file, \
+                atomic_open(self.fine_clip_val_list_path) as fine_clip_val_file:
+            for _, clip_path, _, _, fine_class_number in clip_requests:
+                if not trimmed[clip_path]:
+                    continue
+                if os.path.dirname(clip_path) == self.fine_clip_train_folder:
+                    list_file = fine_clip_train_file
+                else:
+                    list_file = fine_clip_val_file
+                list_file.write(
+                    f"{os.path.basename(clip_path)} {fine_class_number}\n")
+        echo(f"Kinetics clips trimmed: {sum(trimmed.values())} of {len(trimmed)}")
+
+    def _materialize_video(self, src_file_path, dest_file_path):
+        """
+        Copies or hardlinks one video, returning False if it was already in place or could not be copied.
+        """
+        try:
+            if os.path.exists(dest_file_path) and \
+                    os.path.getsize(dest_file_path) == os.path.getsize(src_file_path):
+                return False
+            if self.link:
+                try:
+                    if os.path.lexists(dest_file_path):
+                        os.remove(dest_file_path)
+                    os.link(src_file_path, dest_file_path)
+                    return True
+                except OSError:
+                    pass
+            shutil.copy(src_file_path, dest_file_path)
+            return True
+        except OSError as e:
+            echo(f"Error copying {src_file_path}: {e}")
+            return False
+
+    def _materialize_videos(self, plan, request_counts):
+        """
+        Materializes each planned destination once from its source, using a thread pool.
+        request_counts holds how often each source was requested, for the report of the files saved.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix=threading.current_thread().name) as executor:
+            created = list(executor.map(
+                self._materialize_video, plan.values(), plan.keys()))
+
+        sizes = {}
+        for src_file_path in set(plan.values()):
+            try:
+                sizes[src_file_path] = os.path.getsize(src_file_path)
+            except OSError:
+                sizes[src_file_path] = 0
+
+        requests = sum(request_counts.values())
+        requested_bytes = sum(sizes[src_file_path] * count
+                              for src_file_path, count in request_counts.items())
+        written_bytes = sum(sizes[src_file_path] for src_file_path, is_created
+                            in zip(plan.values(), created) if is_created)
+        echo(f"Kinetics videos materialized: {sum(created)} of {requests} requested, "
+             f"saved {requests - sum(created)} files ({requested_bytes - written_bytes} bytes)")
+
     def _save_class_lists(self, coarse_class_list, fine_class_list):
         """
         Saves the coarse and fine class lists with class names and numbers.
         """
         coarse_folder_path = self.output_folder + "coarse_class_list.txt"
         fine_folder_path = self.output_folder + "fine_class_list.txt"
-        with open(coarse_folder_path, "w") as coarse_file, open(fine_folder_path, "w") as fine_file:
+        with atomic_open(coarse_folder_path) as coarse_file, atomic_open(fine_folder_path) as fine_file:
             for classname, number in coarse_class_list.items():
                 coarse_file.write(f"{classname} {number}\n")
             for classname, number in fine_class_list.items():
@@ -138,7 +277,7 @@ class KineticsParser:
         """
         Generates class lists and saves the video and class list files.
         """
-        if not self.data:
+        if self.data is None or not self._count():
             print("No data provided.")
             return
 
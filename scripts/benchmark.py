@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from main import main
+from utils.video_backend import get_backend
+
+VIA_COMMENT = "# Exported using VGG Image Annotator (http://www.robots.ox.ac.uk/~vgg/software/via)\n"
+VIA_HEADER = "# CSV_HEADER = metadata_id,file_list,flags,temporal_coordinates,spatial_coordinates,metadata\n"
+
+
+class SyntheticDataset:
+    """
+    This class is responsible for generating a reproducible synthetic VIA project: one VIA CSV export per video,
+    in the format ViaCSVReader expects, and one tiny noisy test-pattern MP4 per video encoded with the local ffmpeg.
+    Each video is split into contiguous segments with random fine labels, under one random coarse label.
+    """
+
+    def __init__(self, root: str, videos: int = 20, segments: int = 5, labels: int = 10, coarse_labels: int = 4,
+                 duration: float = 4.0, size: str = '64x48', fps: int = 30, seed: int = 0):
+        self.root = os.path.abspath(root)
+        self.videos = videos
+        self.segments = segments
+        self.labels = labels
+        self.coarse_labels = coarse_labels
+        self.duration = duration
+        self.size = size
+        self.fps = fps
+        self.seed = seed
+        self.csv_folder = os.path.join(root, 'dataset/annotations/via_annotations')
+        self.video_folder = os.path.join(root, 'dataset/videos')
+
+    def config(self):
+        return {'videos': self.videos, 'segments': self.segments, 'labels': self.labels,
+                'coarse_labels': self.coarse_labels, 'duration': self.duration,
+                'size': self.size, 'fps': self.fps, 'seed': self.seed}
+
+    def generate(self):
+        os.makedirs(self.csv_folder, exist_ok=True)
+        os.makedirs(self.video_folder, exist_ok=True)
+        rng = random.Random(self.seed)
+        fine_labels = [f"ACTION{index}" for index in range(self.labels)]
+        coarse_labels = [f"task {index}" for index in range(self.coarse_labels)]
+        video_names = []
+
+        for index in range(self.videos):
+            video_name = f"VID_{index}.mp4"
+            coarse_label = rng.choice(coarse_labels)
+            self._write_csv(os.path.join(self.csv_folder, f"VID_{index}_{coarse_label}.csv"),
+                            video_name, [rng.choice(fine_labels) for _ in range(self.segments)])
+            self._write_video(os.path.join(self.video_folder, video_name), rng.randrange(2 ** 31))
+            video_names.append(video_name)
+
+        with open(os.path.join(self.root, 'video_filenames.json'), 'w') as file:
+            json.dump({'front_view': video_names[::2], 'side_view': video_names[1::2]}, file)
+
+    def _write_csv(self, path, video_name, labels):
+        length = self.duration / len(labels)
+        with open(path, 'w', newline='') as file:
+            file.write(VIA_COMMENT)
+            file.write(VIA_HEADER)
+            for index, label in enumerate(labels):
+                coordinates = json.dumps([round(index * length, 3), round((index + 1) * length, 3)],
+                                         separators=(',', ':'))
+                file_list = json.dumps([video_name]).replace('"', '""')
+                metadata = json.dumps({'1': label}, separators=(',', ':')).replace('"', '""')
+                file.write(f'"1_{index}","{file_list}",0,"{coordinates}","[]","{metadata}"\n')
+
+    def _write_video(self, path, noise_seed):
+        # Seeded noise over the test pattern gives every video its own content, so content-addressed staging
+        # sees as many videos as were generated
+        subprocess.run([get_backend().get_ffmpeg_binary(), '-loglevel', 'error', '-y', '-f', 'lavfi',
+                        '-i', f"testsrc=size={self.size}:rate={self.fps}", '-t', str(self.duration),
+                        '-vf', f"noise=alls=20:allf=t:all_seed={noise_seed}",
+                        '-pix_fmt', 'yuv420p', path], check=True)
+
+
+class StageTimer:
+    """
+    This class is responsible for collecting the per-stage timings of repeated runs and the items each stage
+    handled, from the reports StageProfiler writes.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds, items):
+        stage = self.stages.setdefault(name, {'seconds': [], 'items': 0})
+        stage['seconds'].append(round(seconds, 6))
+        stage['items'] = items
+
+    def add_report(self, report_file):
+        with open(report_file, 'r') as file:
+            report = json.load(file)
+        for stats in report['stages']:
+            self.add(stats['name'], stats['wall_seconds'], stats['items'])
+
+    def summary(self):
+        return {name: {**stage, 'min': min(stage['seconds']),
+                       'median': sorted(stage['seconds'])[len(stage['seconds']) // 2]}
+                for name, stage in self.stages.items()}
+
+
+def _clean(dataset: SyntheticDataset):
+    """
+    Removes everything a previous run left behind: the outputs, the staged videos, the sampled frames, the
+    probe cache, the build manifest and the registry. Only the generated annotations and videos are kept.
+    """
+    shutil.rmtree(os.path.join(dataset.root, 'output'), ignore_errors=True)
+    dataset_folder = os.path.join(dataset.root, 'dataset')
+    for name in os.listdir(dataset_folder):
+        if name in ('annotations', 'videos'):
+            continue
+        path = os.path.join(dataset_folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def _run_pipeline(dataset: SyntheticDataset, timer: StageTimer, workers: int, extract_frames: bool):
+    """
+    Runs main() cold on the synthetic dataset, from the dataset root since main() resolves its state files
+    relative to the working directory, and adds the stage timings of its profile report to the timer.
+    Exporters run one after another while profiling, so each stage is timed on its own.
+    """
+    _clean(dataset)
+    report_file = os.path.join(dataset.root, 'profile.json')
+    cwd = os.getcwd()
+    os.chdir(dataset.root)
+    try:
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            main(dataset.csv_folder, dataset.video_folder, os.path.join(dataset.root, 'output'), workers=workers,
+                 extract_frames=extract_frames, full_rebuild=True, profile_file=report_file)
+        seconds = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+    timer.add_report(report_file)
+    timer.add('total', seconds, dataset.videos)
+
+
+def measure_startup(runs: int = 5):
+    """
+    Times a fresh `python main.py --help`, i.e. interpreter start plus the imports of main.py.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'main.py')
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, main_path, '--help'],
+                       stdout=subprocess.DEVNULL, check=True)
+        seconds.append(round(time.perf_counter() - start, 6))
+    return {'seconds': seconds, 'min': min(seconds),
+            'median': sorted(seconds)[len(seconds) // 2]}
+
+
+def _get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(dataset: SyntheticDataset, repeat: int = 3, workers: int = 1, extract_frames: bool = True,
+              startup_runs: int = 5):
+    startup = measure_startup(startup_runs)
+    start = time.perf_counter()
+    dataset.generate()
+    generate_seconds = time.perf_counter() - start
+
+    timer = StageTimer()
+    for _ in range(repeat):
+        _run_pipeline(dataset, timer, workers, extract_frames)
+
+    return {
+        'commit': _get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'dataset': dataset.config(),
+        'repeat': repeat,
+        'workers': workers,
+        'extract_frames': extract_frames,
+        'generate_seconds': round(generate_seconds, 6),
+        'startup': startup,
+        'stages': timer.summary()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Times each stage of the conversion on a synthetic VIA project.')
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--segments', type=int, default=5,
+                        help='Segments per video.')
+    parser.add_argument('--labels', type=int, default=10,
+                        help='Number of distinct fine labels.')
+    parser.add_argument('--coarse-labels', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=4.0,
+                        help='Length of each synthetic video in seconds.')
+    parser.add_argument('--size', default='64x48',
+                        help='Resolution of the synthetic videos, WIDTHxHEIGHT.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='How often the startup time of main.py is measured.')
+    parser.add_argument('--extract-frames', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--work-dir',
+                        help='Folder the synthetic project is generated in. Default is a temporary folder.')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Path to the JSON results.')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='via_benchmark_')
+    dataset = SyntheticDataset(work_dir, args.videos, args.segments, args.labels, args.coarse_labels,
+                               args.duration, args.size, seed=args.seed)
+    results = benchmark(dataset, args.repeat, args.workers,
+                        args.extract_frames, args.startup_runs)
+    if args.work_dir is None:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"startup: {results['startup']['min']:.4f}s")
+    for name, stage in results['stages'].items():
+        print(f"{name}: {stage['min']:.4f}s ({stage['items']} items)")
+    print(f"Benchmark results written to {args.output}")
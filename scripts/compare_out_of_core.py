@@ -0,0 +1,67 @@
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from main import main
+
+
+def _list_files(folder):
+    return {os.path.relpath(os.path.join(root, filename), folder)
+            for root, _, filenames in os.walk(folder) for filename in filenames}
+
+
+def compare_outputs(first_folder, second_folder):
+    """
+    Returns the relative paths of the files that exist in only one of the folders or differ in content.
+    """
+    first, second = _list_files(first_folder), _list_files(second_folder)
+    differences = sorted(first ^ second)
+    differences += sorted(path for path in first & second
+                          if not filecmp.cmp(os.path.join(first_folder, path),
+                                             os.path.join(second_folder, path), shallow=False))
+    return differences
+
+
+def compare(csv_folder, video_folder, max_rows_in_memory=2, workers=1):
+    """
+    Builds the outputs of a project once in memory and once out of core, and returns the files that differ.
+    The build manifest is kept in the temporary folder, so the project's own manifest is left untouched.
+    """
+    work_dir = tempfile.mkdtemp(prefix='via_compare_')
+    try:
+        in_memory = os.path.join(work_dir, 'in_memory')
+        out_of_core = os.path.join(work_dir, 'out_of_core')
+        main(csv_folder, video_folder, in_memory, workers=workers,
+             manifest_file=os.path.join(work_dir, 'build_manifest.json'), full_rebuild=True)
+        main(csv_folder, video_folder, out_of_core, workers=workers,
+             max_rows_in_memory=max_rows_in_memory, spill_folder=work_dir)
+        return compare_outputs(in_memory, out_of_core)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks that main.py --max-rows-in-memory builds the same outputs as an in-memory run.')
+    parser.add_argument('--csv-folder', default='./dataset/annotations/via_annotations',
+                        help='Path to the folder containing CSV files.')
+    parser.add_argument('--video-folder', default='./dataset/videos',
+                        help='Path to the folder containing video files.')
+    parser.add_argument('--max-rows-in-memory', type=int, default=2,
+                        help='Run size of the out-of-core build; small values exercise the spilling.')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    differences = compare(args.csv_folder, args.video_folder,
+                          args.max_rows_in_memory, args.workers)
+    if differences:
+        print(f"{len(differences)} files differ between the in-memory and the out-of-core build:")
+        for path in differences:
+            print(f"  {path}")
+        sys.exit(1)
+    print("The in-memory and the out-of-core build are identical")
@@ -1,9 +1,25 @@
+import argparse
 import csv
 import glob
-from moviepy.editor import VideoFileClip
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from utils.probe_cache import ProbeCache
+from utils.video_extractor import VideoExtractor
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+parser = argparse.ArgumentParser(
+    description='Exports the duration and frame count of every MP4 file in the current folder to video_info.csv.')
+parser.add_argument('--probe-cache', default=os.path.join(script_dir, '..', 'dataset', 'probe_cache.json'),
+                    help='Path to the video probe cache file, by default the one main.py uses.')
+args = parser.parse_args()
 
 # Step 1: List all MP4 files in the folder
 video_files = glob.glob("*.mp4")
+probe_cache = ProbeCache(args.probe_cache)
 
 # Step 2 & 3: Prepare data list
 data = [["Video Name", "Duration (Min:Sec)", "Total Frames"]]
@@ -11,9 +27,9 @@ total_duration_sec = 0
 total_frames = 0
 
 for video_path in video_files:
-    clip = VideoFileClip(video_path)
-    duration_sec = int(clip.duration)
-    frames = int(clip.fps * clip.duration)
+    info = VideoExtractor(None, video_path, probe_cache).probe()
+    duration_sec = int(info['duration'])
+    frames = info['frames']
     
     # Update totals
     total_duration_sec += duration_sec
@@ -25,6 +41,8 @@ for video_path in video_files:
     # Append video data
     data.append([video_path.split("/")[-1], duration_min_sec, frames])
 
+probe_cache.save()
+
 # Step 5: Calculate and append totals
 total_min_sec = f"{total_duration_sec // 60}:{total_duration_sec % 60}"
 data.append(["Total", total_min_sec, total_frames])
@@ -32,4 +50,4 @@ data.append(["Total", total_min_sec, total_frames])
 # Step 6: Export to CSV
 with open("video_info.csv", "w", newline="") as file:
     writer = csv.writer(file)
-    writer.writerows(data)
\ No newline at end of file
+    writer.writerows(data)
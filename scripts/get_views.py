@@ -1,28 +1,22 @@
 import os
-import json
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from utils.view_index import ViewIndex
+
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
 # Construct absolute paths to the folders
 front_view_path = os.path.join(script_dir, '..', 'dataset', 'front_view')
 side_view_path = os.path.join(script_dir, '..', 'dataset', 'side_view')
 
-
-def read_video_filenames(folder_path):
-    """Read video filenames from a folder."""
-    video_filenames = [file for file in os.listdir(
-        folder_path) if file.endswith('.mp4')]
-    return video_filenames
-
-
-# Initialize dictionary to store filenames
-video_filenames_dict = {}
-
-# Read and store video filenames from both folders
-video_filenames_dict['front_view'] = read_video_filenames(front_view_path)
-video_filenames_dict['side_view'] = read_video_filenames(side_view_path)
+# Rescan both folders and store their filenames, main.py also does this whenever a folder changes
+view_index = ViewIndex('video_filenames.json', {
+    'front_view': front_view_path,
+    'side_view': side_view_path
+}, refresh=False)
+video_filenames_dict = view_index.rebuild()
 
 # Print or return the dictionary
 print(video_filenames_dict)
-
-with open('video_filenames.json', 'w') as json_file:
-    json.dump(video_filenames_dict, json_file, indent=4)
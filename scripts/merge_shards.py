@@ -0,0 +1,115 @@
+import argparse
+import glob
+import os
+import pickle
+import sys
+from functools import partial
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from parsers.basic_parser import BaseParser
+from utils.annotation_store import AnnotationStore
+from utils.clip_trimmer import ClipTrimmer
+from utils.json_stream import JSONStreamWriter
+from utils.pipeline import FORMATS, TARGET_FOLDER, export_activitynet, export_kinetics, parse_formats, run_exporters
+from utils.stage_profiler import StageProfiler
+from utils.video_stager import VideoStager
+
+
+def load_parts(part_files):
+    """
+    Loads the part files of a sharded run and checks that they are all the shards of the same annotation set.
+    Returns the parts and the formats every shard was built with.
+    """
+    parts = []
+    for part_file in part_files:
+        with open(part_file, 'rb') as file:
+            parts.append(pickle.load(file))
+    if not parts:
+        raise ValueError("No part files found")
+
+    count = parts[0]['shard'][1]
+    fingerprint = parts[0]['fingerprint']
+    indexes = sorted(part['shard'][0] for part in parts)
+    if indexes != list(range(count)) or any(part['shard'][1] != count for part in parts):
+        raise ValueError(
+            f"Expected the parts of shards 0 to {count - 1} once each, got {sorted(tuple(part['shard']) for part in parts)}")
+    if any(part['fingerprint'] != fingerprint for part in parts):
+        raise ValueError("The parts were built from different annotation sets")
+
+    total = parts[0]['videos']
+    found = sum(len(part['entries']) + part['skipped'] for part in parts)
+    if found != total:
+        raise ValueError(f"The parts hold {found} videos, expected {total}")
+
+    formats = set(FORMATS)
+    for part in parts:
+        formats &= set(part['formats'])
+    return parts, formats
+
+
+def _export_nuylsushi(output_folder, sushi_entries, json_backend, profiler):
+    with profiler.stage('nuylsushi', [output_folder + '/nuylsushi']) as stage:
+        parser = BaseParser(
+            output_folder + '/nuylsushi/annotations.json', json_backend)
+        parser.save_annotation(sushi_entries)
+        stage.items = len(sushi_entries)
+
+
+def merge(parts, output_folder, formats, stage_mode='auto', trim_clips=None, json_backend='json',
+          profiler=None):
+    """
+    Builds the outputs of the whole annotation set from the parts of its shards. The videos are put back in
+    the order a single-node run reads them, so class numbers, taxonomy node IDs, the train/val split and every
+    output file come out identical. Probing and frame sampling are already done, only the Kinetics videos are
+    copied or linked here, from the shared staging folder.
+    """
+    profiler = profiler or StageProfiler()
+    entries = sorted((entry for part in parts for entry in part['entries']),
+                     key=lambda entry: entry[0])
+    annotations = AnnotationStore([annotation for _, annotation, _ in entries])
+    if len(annotations) == 0:
+        print("No annotation data found or an error occurred.")
+        return
+
+    exporters = {
+        'activitynet': partial(export_activitynet, output_folder, annotations, json_backend, profiler),
+        'kinetics': partial(export_kinetics, output_folder, annotations, TARGET_FOLDER,
+                            stage_mode in ('auto', 'hardlink'), trim_clips, profiler),
+        'nuylsushi': partial(_export_nuylsushi, output_folder, [sushi_entry for _, _, sushi_entry in entries],
+                             json_backend, profiler)
+    }
+    run_exporters([(name, exporters[name])
+                   for name in FORMATS if name in formats], profiler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Merges the part files written by main.py --shard I/N into the outputs of a single-node run.')
+    parser.add_argument('parts', nargs='*',
+                        help='Part files to merge, by default OUTPUT_FOLDER/shards/*.pickle.')
+    parser.add_argument('--output-folder', default='./output',
+                        help='Path to the folder for storing output files.')
+    parser.add_argument('--formats', default=FORMATS, type=parse_formats,
+                        help=f"Comma-separated outputs to build, by default {','.join(FORMATS)}.")
+    parser.add_argument('--stage-mode', default='auto', choices=VideoStager.MODES,
+                        help='The stage mode of the shards; auto and hardlink link the Kinetics videos.')
+    parser.add_argument('--trim-clips', default=None, choices=ClipTrimmer.MODES,
+                        help='Also trim fine segments into Kinetics clips by stream copy or re-encode.')
+    parser.add_argument('--json-backend', default='json', choices=JSONStreamWriter.BACKENDS,
+                        help='JSON encoder for the outputs; simplejson is used only if installed.')
+    args = parser.parse_args()
+
+    part_files = args.parts or sorted(glob.glob(
+        os.path.join(args.output_folder, 'shards', '*.pickle')))
+    try:
+        parts, formats = load_parts(part_files)
+    except (OSError, ValueError, pickle.UnpicklingError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    missing = [name for name in args.formats if name not in formats]
+    if missing:
+        print(f"Skipping {', '.join(missing)}, not built by every shard")
+    merge(parts, args.output_folder, [name for name in args.formats if name in formats],
+          args.stage_mode, args.trim_clips, args.json_backend)
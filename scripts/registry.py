@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from utils.probe_cache import ProbeCache
+from utils.video_registry import VideoRegistry
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries the registry of staged videos.')
+    parser.add_argument('--registry', default='./dataset/registry.sqlite',
+                        help='Path to the SQLite registry.')
+    parser.add_argument('--probe-cache', default='./dataset/probe_cache.json',
+                        help='Path to the video probe cache file, which holds the probe info of staged videos.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    find_parser = commands.add_parser(
+        'find', help='Show the sources matching a source path, original filename, content hash or video ID.')
+    find_parser.add_argument('name')
+    show_parser = commands.add_parser(
+        'show', help='Show the staged path, probe info and frame stats of a video ID.')
+    show_parser.add_argument('video_id')
+    commands.add_parser('videos', help='List every registered video.')
+    commands.add_parser('sources', help='List every registered source video.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.registry):
+        print(f"Error: File not found - {args.registry}")
+        sys.exit(1)
+
+    registry = VideoRegistry(args.registry)
+    if args.command == 'find':
+        result = registry.find(args.name)
+    elif args.command == 'show':
+        result = registry.get_video(args.video_id)
+        if result is not None and result['staged_path']:
+            result['probe'] = ProbeCache(args.probe_cache).get(result['staged_path'])
+    elif args.command == 'videos':
+        result = registry.videos()
+    else:
+        result = registry.sources()
+    registry.close()
+
+    print(json.dumps(result, indent=2))
+    if not result:
+        sys.exit(1)
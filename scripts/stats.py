@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from utils.annotation_store import AnnotationStore
+from utils.csv_reader import ViaCSVReader
+from utils.dataset_stats import DatasetStats
+from utils.pipeline import probe_videos
+from utils.probe_cache import ProbeCache
+from utils.view_index import ViewIndex
+
+
+def collect(csv_folder, video_folder, probe_cache, view_index, workers=1):
+    """
+    Reads the annotation set and the probe info of its videos. Only videos missing from the probe cache
+    are opened, in parallel when workers > 1.
+    """
+    annotations = AnnotationStore()
+    for parent_label, filename, label, coordinates in ViaCSVReader(csv_folder, workers):
+        annotations.add_row(parent_label, filename, label, coordinates)
+
+    video_infos = {}
+    for filename, info in probe_videos(annotations.filenames(), video_folder, probe_cache, workers).items():
+        annotation = annotations.get(filename)
+        annotation.set_video_info(info)
+        annotation.view = view_index.get_view(filename)
+        video_infos[filename] = probe_cache.get(annotation.url) if annotation.url else None
+    annotations.reindex()
+    return annotations, video_infos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Reports per-video, per-class and per-view totals and segment length histograms.')
+    parser.add_argument('--csv-folder', default='./dataset/annotations/via_annotations',
+                        help='Path to the folder containing CSV files.')
+    parser.add_argument('--video-folder', default='./dataset/videos',
+                        help='Path to the folder containing video files.')
+    parser.add_argument('--probe-cache', default='./dataset/probe_cache.json',
+                        help='Path to the video probe cache file.')
+    parser.add_argument('--view-index', default='video_filenames.json',
+                        help='Path to the index of front and side view videos.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used to read CSV files and probe uncached videos.')
+    parser.add_argument('--bins', type=int, default=20,
+                        help='Number of bins of the segment length histograms.')
+    parser.add_argument('--format', default='json', choices=('json', 'csv'))
+    parser.add_argument('--output', default=None,
+                        help='Output file for json, output folder for csv. Default is dataset_stats(.json).')
+    args = parser.parse_args()
+
+    probe_cache = ProbeCache(args.probe_cache)
+    annotations, video_infos = collect(args.csv_folder, args.video_folder, probe_cache,
+                                       ViewIndex(args.view_index), args.workers)
+    probe_cache.save()
+
+    stats = DatasetStats(annotations, video_infos, args.bins)
+    if args.format == 'csv':
+        stats.save_csv(args.output or 'dataset_stats')
+    else:
+        stats.save_json(args.output or 'dataset_stats.json')
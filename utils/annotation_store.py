@@ -0,0 +1,91 @@
+import os
+
+from formats.activitynet.annotation import ActivityNetAnnotation
+
+
+class AnnotationStore:
+    """
+    This class is responsible for holding the ActivityNetAnnotation objects of a run.
+    It groups VIA rows by video filename and keeps hash indexes by filename, basename and coarse label,
+    so parsers and the taxonomy can look annotations up without re-scanning the whole list.
+    """
+
+    def __init__(self, annotations: list = None):
+        self.annotations = []
+        self.filename_index = {}
+        self.basename_index = {}
+        self.label_index = {}
+        self.fine_label_index = {}
+
+        for annotation in annotations or []:
+            self.add(annotation)
+
+    def _index(self, annotation: ActivityNetAnnotation):
+        basename, _ = os.path.splitext(annotation.filename)
+        self.filename_index.setdefault(annotation.filename, annotation)
+        self.basename_index.setdefault(basename, []).append(annotation)
+        self.label_index.setdefault(annotation.label, []).append(annotation)
+        self.fine_label_index.setdefault(annotation.label, set()).update(
+            annotation.segments.label_set())
+
+    def add(self, annotation: ActivityNetAnnotation):
+        self.annotations.append(annotation)
+        self._index(annotation)
+
+    def add_row(self, parent_label: str, filename: str, label: str, coordinates: list):
+        """
+        Adds a VIA row, either as a new video annotation or as a segment of an existing one.
+        """
+        annotation = self.filename_index.get(filename)
+        if annotation is None:
+            annotation = ActivityNetAnnotation(
+                parent_label, filename, label, coordinates, None)
+            self.add(annotation)
+        else:
+            annotation.add_annotation(coordinates, label)
+            self.fine_label_index[annotation.label].add(label)
+        return annotation
+
+    def reindex(self):
+        """
+        Rebuilds the indexes, e.g. after staging has renamed the videos.
+        """
+        self.filename_index = {}
+        self.basename_index = {}
+        self.label_index = {}
+        self.fine_label_index = {}
+        for annotation in self.annotations:
+            self._index(annotation)
+
+    def get(self, filename: str):
+        return self.filename_index.get(filename)
+
+    def get_by_basename(self, basename: str):
+        return self.basename_index.get(basename, [])
+
+    def get_by_label(self, label: str):
+        return self.label_index.get(label, [])
+
+    def filenames(self):
+        return list(self.filename_index)
+
+    def basenames(self):
+        return list(self.basename_index)
+
+    def labels(self):
+        return list(self.label_index)
+
+    def get_label_sets(self):
+        """
+        Returns the set of fine labels used under each coarse label.
+        """
+        return self.fine_label_index
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def __iter__(self):
+        return iter(self.annotations)
+
+    def __getitem__(self, index):
+        return self.annotations[index]
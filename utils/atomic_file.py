@@ -0,0 +1,46 @@
+import os
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', **kwargs):
+    """
+    Opens a temporary file next to path for writing and renames it over path once the block completes,
+    so readers only ever see the previous or the complete new file. On errors the temporary file is removed.
+    Every call writes its own temporary file, so concurrent writers of the same path never share one.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Holds an exclusive lock on path for the block, through a lock file next to it, so processes that read,
+    merge and rewrite the same state file take turns. Without fcntl the block runs unlocked.
+    """
+    if fcntl is None:
+        yield
+        return
+    folder_path = os.path.dirname(path)
+    if folder_path:
+        os.makedirs(folder_path, exist_ok=True)
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+
+from utils.atomic_file import atomic_open
+
+
+class BuildManifest:
+    """
+    This class is responsible for remembering what the previous run read and produced, so a rerun only
+    rebuilds what changed. It records the content hash and parsed rows of every CSV file, and for every
+    staged video a fingerprint of its annotation together with the output entries it produced.
+    Videos are keyed by source path, video ID, view and task (see get_video_key), so two sources that share a
+    staged video never share entries. Entries are only reused while the build options are unchanged.
+    """
+
+    def __init__(self, manifest_file: str = "./dataset/build_manifest.json", options: dict = None, reuse: bool = True):
+        self.manifest_file = manifest_file
+        self.options = options or {}
+        stored = self._load() if reuse else {}
+        self.csv_files = stored.get('csv_files', {})
+        self.videos = stored.get(
+            'videos', {}) if stored.get('options') == self.options else {}
+        self.seen_csv_files = set()
+        self.fingerprints = {}
+        self.reused = set()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_file):
+            return {}
+        try:
+            with open(self.manifest_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading build manifest {self.manifest_file}: {e}")
+            return {}
+
+    def _hash_file(self, path: str):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def get_csv_rows(self, path: str):
+        """
+        Returns the rows parsed from path in a previous run, or None if the file is new or its content changed.
+        """
+        key = os.path.abspath(path)
+        self.seen_csv_files.add(key)
+        entry = self.csv_files.get(key)
+        if entry is None:
+            return None
+        # The file may have been replaced or removed since it was listed; the reader then reports it
+        try:
+            stat = os.stat(path)
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                return [tuple(row) for row in entry['rows']]
+            # Touched but possibly unchanged: compare the content hash before reparsing
+            if entry['size'] == stat.st_size and entry['hash'] == self._hash_file(path):
+                entry['mtime'] = stat.st_mtime_ns
+                return [tuple(row) for row in entry['rows']]
+        except OSError:
+            pass
+        return None
+
+    def put_csv_rows(self, path: str, rows: list):
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+            file_hash = self._hash_file(path)
+        except OSError:
+            # Removed right after it was read: the rows are used, but not remembered for the next run
+            return
+        self.seen_csv_files.add(key)
+        self.csv_files[key] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': file_hash,
+            'videos': sorted({row[1] for row in rows}),
+            'rows': rows
+        }
+
+    @staticmethod
+    def get_video_key(source_path: str, video_id: str, view: str, task: str):
+        return json.dumps([os.path.abspath(source_path), video_id, view, task])
+
+    def add_video(self, key: str, entry: dict):
+        """
+        Fingerprints the ActivityNet entry of a staged video. It covers the video ID, the probe info, the view
+        and every segment, i.e. everything the per-video outputs depend on.
+        """
+        fingerprint = hashlib.sha256(json.dumps(
+            entry, sort_keys=True).encode()).hexdigest()
+        self.fingerprints[key] = fingerprint
+        return fingerprint
+
+    def get_output(self, key: str, output: str, is_valid=None):
+        """
+        Returns the entry a previous run produced for the video in the given output, if the video is unchanged.
+        is_valid, if given, is called with the entry to check that the files it refers to still exist.
+        """
+        stored = self.videos.get(key)
+        if stored is None or stored['fingerprint'] != self.fingerprints.get(key):
+            return None
+        value = stored['outputs'].get(output)
+        if value is None or (is_valid is not None and not is_valid(value)):
+            return None
+        self.reused.add(key)
+        return value
+
+    def put_output(self, key: str, output: str, value):
+        stored = self.videos.get(key)
+        if stored is None or stored['fingerprint'] != self.fingerprints.get(key):
+            stored = self.videos[key] = {
+                'fingerprint': self.fingerprints.get(key),
+                'outputs': {}
+            }
+        stored['outputs'][output] = value
+
+    def save(self):
+        # Forget CSV files and videos that are no longer part of the project
+        csv_files = {key: entry for key, entry in self.csv_files.items()
+                     if key in self.seen_csv_files}
+        videos = {key: entry for key, entry in self.videos.items()
+                  if key in self.fingerprints}
+
+        folder_path = os.path.dirname(self.manifest_file)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        with atomic_open(self.manifest_file) as file:
+            json.dump({'options': self.options, 'csv_files': csv_files,
+                       'videos': videos}, file)
+        print(f"Incremental build: reused {len(self.reused)} of {len(self.fingerprints)} videos")
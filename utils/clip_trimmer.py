@@ -0,0 +1,82 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.console import echo
+from utils.video_backend import VideoBackend, get_backend
+
+
+class ClipTrimmer:
+    """
+    This class is responsible for cutting annotated segments out of videos into their own clips.
+    In 'copy' mode the streams are copied from the keyframe at or before the segment start, which is fast but
+    may start slightly early; in 'encode' mode the segment is re-encoded and cut exactly.
+    Each clip is written by its own ffmpeg process and non-empty clips that already exist are skipped.
+    Zero-length segments get no clip.
+    """
+
+    MODES = ('copy', 'encode')
+
+    def __init__(self, mode: str = 'copy', workers: int = 4, backend: VideoBackend = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown trim mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.workers = workers
+        self.backend = backend or get_backend()
+
+    def _get_ffmpeg_binary(self):
+        return self.backend.get_ffmpeg_binary()
+
+    def _build_command(self, ffmpeg, src_file_path, clip_path, start_time, end_time):
+        command = [ffmpeg, '-y', '-loglevel', 'error',
+                   '-ss', f"{start_time:.3f}", '-i', src_file_path,
+                   '-t', f"{end_time - start_time:.3f}",
+                   '-map', '0:v:0', '-map', '0:a?']
+        if self.mode == 'copy':
+            command += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        else:
+            command += ['-c:v', 'libx264', '-preset', 'veryfast',
+                        '-c:a', 'aac']
+        return command + [clip_path]
+
+    def _trim(self, ffmpeg, src_file_path, clip_path, start_time, end_time):
+        # ffmpeg takes -t 0 as no limit, so point segments would be cut into clips of the rest of the video
+        if round(end_time - start_time, 3) <= 0:
+            echo(f"Skipping the zero-length segment [{start_time}, {end_time}] of {src_file_path}")
+            if os.path.exists(clip_path):
+                os.remove(clip_path)
+            return False
+        if os.path.exists(clip_path) and os.path.getsize(clip_path) > 0:
+            return True
+        tmp_path = clip_path + '.part.mp4'
+        result = subprocess.run(
+            self._build_command(ffmpeg, src_file_path, tmp_path,
+                                start_time, end_time),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            echo(f"Error trimming {src_file_path} [{start_time}, {end_time}]: "
+                 f"{result.stderr.decode(errors='replace').strip()}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            echo(f"Error trimming {src_file_path} [{start_time}, {end_time}]: empty clip")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, clip_path)
+        return True
+
+    def trim(self, requests):
+        """
+        Trims a list of (src_file_path, clip_path, start_time, end_time) requests and returns a success flag per request.
+        """
+        ffmpeg = self._get_ffmpeg_binary()
+        for _, clip_path, _, _ in requests:
+            os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix=threading.current_thread().name) as executor:
+            return list(executor.map(
+                lambda request: self._trim(ffmpeg, *request), requests))
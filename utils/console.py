@@ -0,0 +1,23 @@
+import sys
+import threading
+
+EXPORTER_THREAD_PREFIX = 'export-'
+
+_lock = threading.Lock()
+
+
+def get_exporter_thread_name(name: str):
+    return EXPORTER_THREAD_PREFIX + name
+
+
+def echo(message: str):
+    """
+    Prints one line in a single write, so lines of exporters running side by side never mix. On an exporter
+    thread, or a pool thread named after it, the line is prefixed with the exporter's name.
+    """
+    name = threading.current_thread().name
+    if name.startswith(EXPORTER_THREAD_PREFIX):
+        message = f"[{name[len(EXPORTER_THREAD_PREFIX):].split('_')[0]}] {message}"
+    with _lock:
+        sys.stdout.write(message + '\n')
+        sys.stdout.flush()
@@ -1,53 +1,137 @@
 import csv
 import os
 import re
-from io import StringIO
-import jsonpickle
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 
 class ViaCSVReader:
     """
     This class is responsible for reading and processing VIA's annotation CSV files from a given folder.
     It provides methods to get a list of CSV files, process the CSV header, and read the CSV files.
+    Rows are produced lazily while iterating; with workers > 1 the CSV files are parsed in parallel processes.
+    Given a BuildManifest, files whose content is unchanged since the last run are not parsed again.
+    A file that is not a valid VIA export, or that changes while it is read, is skipped with an error and not
+    recorded in the manifest, so it is read again once it has been written completely.
     """
 
-    def __init__(self, csv_folder: str):
-        self.data = []
-        self._read(csv_folder)
+    def __init__(self, csv_folder: str, workers: int = 1, manifest=None):
+        self.csv_folder = csv_folder
+        self.workers = workers
+        self.manifest = manifest
+        self._data = None
+
+    def __getstate__(self):
+        # Worker processes only need the parsing methods, not the manifest or the rows read so far
+        return {**self.__dict__, 'manifest': None, '_data': None}
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = list(self)
+        return self._data
+
+    def __iter__(self):
+        if self._data is not None:
+            return iter(self._data)
+        return self._read(self.csv_folder)
 
     def _read(self, csv_folder: str):
-        for csv_file in self._get_csv_list(csv_folder):
-            for row in csv.DictReader(StringIO(self._process_csv_header(csv_file))):
-                video_filename = jsonpickle.decode(row['file_list'])[0]
-                parent_label = self._get_parent_label(csv_file, video_filename)
-                label = jsonpickle.decode(row['metadata'])['1']
-                if label == '1_CUTTING-SALMON':
-                    label = 'CUTTING-SALMON'
-                temporal_coordinates = jsonpickle.decode(
-                    row['temporal_coordinates'])
-
-                self.data.append(
-                    (parent_label, video_filename, label, temporal_coordinates))
+        csv_files = self._get_csv_list(csv_folder)
+        cached = {}
+        if self.manifest is not None:
+            for csv_file in csv_files:
+                rows = self.manifest.get_csv_rows(csv_file)
+                if rows is not None:
+                    cached[csv_file] = rows
+        misses = [csv_file for csv_file in csv_files if csv_file not in cached]
+
+        executor = None
+        if self.workers > 1 and len(misses) > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            parsed = self._map_bounded(executor, misses)
+        else:
+            parsed = map(self._read_file_rows, misses)
+
+        try:
+            for csv_file in csv_files:
+                if csv_file in cached:
+                    yield from cached[csv_file]
+                    continue
+                rows = next(parsed)
+                if rows is None:
+                    continue
+                if self.manifest is not None:
+                    self.manifest.put_csv_rows(csv_file, rows)
+                yield from rows
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _map_bounded(self, executor, csv_files):
+        """
+        Yields the rows of the CSV files in order, parsing at most two files per worker ahead of the consumer.
+        executor.map would submit every file at once and hold all parsed rows until they are read.
+        """
+        csv_files = iter(csv_files)
+        pending = deque(executor.submit(self._read_file_rows, csv_file)
+                        for csv_file in islice(csv_files, self.workers * 2))
+        while pending:
+            rows = pending.popleft().result()
+            for csv_file in islice(csv_files, 1):
+                pending.append(executor.submit(self._read_file_rows, csv_file))
+            yield rows
+
+    def _read_file_rows(self, csv_file: str):
+        """
+        Returns the rows of a CSV file, or None when it is malformed or its size or mtime changed while reading.
+        """
+        try:
+            before = os.stat(csv_file)
+            rows = list(self._read_file(csv_file))
+            after = os.stat(csv_file)
+        except OSError as e:
+            print(f'Error: {e}')
+            return None
+        except (ValueError, KeyError, IndexError, TypeError, csv.Error) as e:
+            print(f'Error: skipping {csv_file}, not a valid VIA export: {e}')
+            return None
+        if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+            print(f'Error: skipping {csv_file}, it changed while being read')
+            return None
+        return rows
+
+    def _read_file(self, csv_file: str):
+        for row in csv.DictReader(self._process_csv_header(csv_file)):
+            video_filename = json.loads(row['file_list'])[0]
+            parent_label = self._get_parent_label(csv_file, video_filename)
+            label = json.loads(row['metadata'])['1']
+            if label == '1_CUTTING-SALMON':
+                label = 'CUTTING-SALMON'
+            temporal_coordinates = json.loads(row['temporal_coordinates'])
+
+            yield (parent_label, video_filename, label, temporal_coordinates)
 
     def _get_csv_list(self, csv_folder: str):
+        # Sorted, so the row order, and with it the video order, is the same on every machine
         return [os.path.join(csv_folder, filename)
-                for filename in os.listdir(csv_folder)
+                for filename in sorted(os.listdir(csv_folder))
                 if filename.endswith('.csv')]
 
     def _process_csv_header(self, filename: str):
-        try:
-            with open(filename, 'r') as original_file:
-                modified_text = '\n'.join(line.replace('# CSV_HEADER = ', '')
-                                          for line in original_file.readlines()
-                                          if not (line.startswith('#') and 'CSV_HEADER' not in line))
-
-                return modified_text
-        except FileNotFoundError:
-            print(f'Error: File not found - {filename}')
-            return None
-        except Exception as e:
-            print(f'Error: {e}')
-            return None
+        """
+        Yields the lines of a VIA CSV export, dropping its comments and un-commenting the CSV_HEADER line.
+        Read and decode errors are raised, so _read_file_rows skips the file instead of caching it as empty.
+        """
+        with open(filename, 'r', newline='') as original_file:
+            for line in original_file:
+                if line.startswith('#'):
+                    if 'CSV_HEADER' not in line:
+                        continue
+                    line = line.replace('# CSV_HEADER = ', '')
+                yield line
 
     def _get_parent_label(self, csvfile_name: str, video_filename: str):
 
@@ -0,0 +1,188 @@
+import os
+import csv
+import json
+
+import numpy as np
+
+from utils.annotation_store import AnnotationStore
+
+
+class DatasetStats:
+    """
+    This class is responsible for summarizing an annotated video library: totals per video, per coarse class,
+    per fine class and per view, and histograms of segment lengths, overall and per fine class.
+    All segments are gathered into flat NumPy columns once and every total is a single bincount over them,
+    so the cost is dominated by reading the annotations and probe info, not by the aggregation.
+    """
+
+    def __init__(self, annotations: AnnotationStore, video_infos: dict, bins: int = 20):
+        self.annotations = list(annotations)
+        self.video_infos = video_infos
+        self.bins = bins
+
+    def _get_video_columns(self):
+        infos = [self.video_infos.get(annotation.filename) or {}
+                 for annotation in self.annotations]
+        resolutions = [info.get('resolution') or [0, 0] for info in infos]
+        return {
+            'duration': np.array([info.get('duration') or 0 for info in infos], dtype=np.float64),
+            'fps': np.array([info.get('fps') or 0 for info in infos], dtype=np.float64),
+            'frames': np.array([info.get('frames') or 0 for info in infos], dtype=np.int64),
+            'width': np.array([resolution[0] for resolution in resolutions], dtype=np.int64),
+            'height': np.array([resolution[1] for resolution in resolutions], dtype=np.int64)
+        }
+
+    def _get_segment_columns(self):
+        counts = np.array([len(annotation.segments)
+                          for annotation in self.annotations], dtype=np.int64)
+        starts, ends, labels = [], [], []
+        for annotation in self.annotations:
+            segment_starts, segment_ends, _ = annotation.segments.as_arrays()
+            starts.append(segment_starts)
+            ends.append(segment_ends)
+            labels.extend(annotation.segments.labels())
+        starts = np.concatenate(starts) if starts else np.zeros(0)
+        ends = np.concatenate(ends) if ends else np.zeros(0)
+        owners = np.repeat(np.arange(len(self.annotations)), counts)
+        return counts, ends - starts, np.array(labels, dtype=object), owners
+
+    def _group(self, keys):
+        """
+        Returns the sorted distinct keys and, for every item, the index of its key.
+        """
+        keys = np.array([str(key) for key in keys], dtype=object)
+        if not len(keys):
+            return [], np.zeros(0, dtype=np.int64)
+        groups, inverse = np.unique(keys, return_inverse=True)
+        return groups.tolist(), inverse
+
+    def _get_totals(self, groups, inverse, videos, segment_counts, annotated):
+        size = len(groups)
+        return [{
+            'videos': int(video_count),
+            'duration': round(float(duration), 3),
+            'frames': int(frames),
+            'segments': int(segments),
+            'annotated_seconds': round(float(seconds), 3)
+        } for video_count, duration, frames, segments, seconds in zip(
+            np.bincount(inverse, minlength=size),
+            np.bincount(inverse, weights=videos['duration'], minlength=size),
+            np.bincount(inverse, weights=videos['frames'], minlength=size),
+            np.bincount(inverse, weights=segment_counts, minlength=size),
+            np.bincount(inverse, weights=annotated, minlength=size))]
+
+    def compute(self):
+        videos = self._get_video_columns()
+        segment_counts, lengths, labels, owners = self._get_segment_columns()
+        annotated = np.bincount(owners, weights=lengths, minlength=len(self.annotations))
+
+        video_rows = [{
+            'filename': annotation.filename,
+            'label': annotation.label,
+            'view': annotation.view,
+            'duration': round(float(duration), 3),
+            'fps': float(fps),
+            'frames': int(frames),
+            'width': int(width),
+            'height': int(height),
+            'segments': int(count),
+            'annotated_seconds': round(float(seconds), 3)
+        } for annotation, duration, fps, frames, width, height, count, seconds in zip(
+            self.annotations, videos['duration'], videos['fps'], videos['frames'], videos['width'],
+            videos['height'], segment_counts, annotated)]
+
+        coarse_groups, coarse_inverse = self._group(
+            annotation.label for annotation in self.annotations)
+        coarse_rows = [{'label': label, **totals} for label, totals in zip(
+            coarse_groups, self._get_totals(coarse_groups, coarse_inverse, videos, segment_counts, annotated))]
+
+        view_groups, view_inverse = self._group(
+            annotation.view for annotation in self.annotations)
+        view_rows = [{'view': view, **totals} for view, totals in zip(
+            view_groups, self._get_totals(view_groups, view_inverse, videos, segment_counts, annotated))]
+
+        fine_groups, fine_inverse = self._group(labels)
+        size = len(fine_groups)
+        fine_counts = np.bincount(fine_inverse, minlength=size)
+        fine_seconds = np.bincount(fine_inverse, weights=lengths, minlength=size)
+        shortest = np.full(size, np.inf)
+        longest = np.full(size, -np.inf)
+        np.minimum.at(shortest, fine_inverse, lengths)
+        np.maximum.at(longest, fine_inverse, lengths)
+        # A label counts once per video it appears in
+        pairs = np.unique(owners * size + fine_inverse)
+        fine_videos = np.bincount(pairs % max(size, 1), minlength=size)
+        fine_rows = [{
+            'label': label,
+            'videos': int(video_count),
+            'segments': int(count),
+            'seconds': round(float(seconds), 3),
+            'mean_seconds': round(float(seconds / count), 3),
+            'min_seconds': round(float(low), 3),
+            'max_seconds': round(float(high), 3)
+        } for label, video_count, count, seconds, low, high in zip(
+            fine_groups, fine_videos, fine_counts, fine_seconds, shortest, longest)]
+
+        edges = np.histogram_bin_edges(lengths, bins=self.bins)
+        bin_indices = np.clip(np.searchsorted(edges, lengths, side='right') - 1, 0, self.bins - 1)
+        per_class = np.bincount(fine_inverse * self.bins + bin_indices,
+                                minlength=size * self.bins).reshape(size, self.bins)
+
+        return {
+            'totals': {
+                'videos': len(self.annotations),
+                'duration': round(float(videos['duration'].sum()), 3),
+                'frames': int(videos['frames'].sum()),
+                'segments': int(segment_counts.sum()),
+                'annotated_seconds': round(float(lengths.sum()), 3),
+                'coarse_classes': len(coarse_groups),
+                'fine_classes': size,
+                'missing_videos': sum(1 for annotation in self.annotations
+                                      if not self.video_infos.get(annotation.filename))
+            },
+            'videos': video_rows,
+            'coarse_classes': coarse_rows,
+            'fine_classes': fine_rows,
+            'views': view_rows,
+            'segment_lengths': {
+                'bin_edges': [round(float(edge), 6) for edge in edges],
+                'counts': per_class.sum(axis=0).tolist(),
+                'per_class': {label: counts for label, counts in zip(fine_groups, per_class.tolist())}
+            }
+        }
+
+    def save_json(self, output_file: str, report: dict = None):
+        report = report or self.compute()
+        folder_path = os.path.dirname(output_file)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        with open(output_file, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Statistics written to {output_file}")
+
+    def save_csv(self, output_folder: str, report: dict = None):
+        """
+        Writes one CSV file per table: totals, videos, coarse_classes, fine_classes, views and segment_lengths.
+        """
+        report = report or self.compute()
+        os.makedirs(output_folder, exist_ok=True)
+        tables = {name: report[name] for name in ('videos', 'coarse_classes', 'fine_classes', 'views')}
+        tables['totals'] = [report['totals']]
+
+        histogram = report['segment_lengths']
+        edges = histogram['bin_edges']
+        tables['segment_lengths'] = [{
+            'bin_start': edges[index],
+            'bin_end': edges[index + 1],
+            'count': count,
+            **{label: counts[index] for label, counts in histogram['per_class'].items()}
+        } for index, count in enumerate(histogram['counts'])]
+
+        for name, rows in tables.items():
+            with open(os.path.join(output_folder, f"{name}.csv"), 'w', newline='') as file:
+                if not rows:
+                    continue
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"Statistics written to {output_folder}")
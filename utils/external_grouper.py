@@ -0,0 +1,93 @@
+import os
+import json
+import heapq
+import shutil
+import tempfile
+from itertools import groupby
+
+
+class ExternalGrouper:
+    """
+    This class is responsible for grouping VIA rows by video filename without holding them all in memory.
+    Rows are buffered up to run_size, sorted by (filename, arrival order) and spilled to a run file on disk.
+    The runs are k-way merged into one group per video, and the groups are sorted again, externally, by their
+    first row, so videos come out in the order they were first read, like AnnotationStore.add_row groups them.
+    Memory stays bounded by run_size rows plus one read buffer per run. groups() can be iterated repeatedly.
+    """
+
+    def __init__(self, run_size: int = 100000, spill_folder: str = None):
+        self.run_size = run_size
+        if spill_folder:
+            os.makedirs(spill_folder, exist_ok=True)
+        self.spill_folder = tempfile.mkdtemp(prefix='via_runs_', dir=spill_folder)
+        self.buffer = []
+        self.runs = []
+        self.group_runs = None
+        self.rows = 0
+
+    def add(self, row: tuple):
+        self.group_runs = None
+        self.buffer.append((row[1], self.rows, row))
+        self.rows += 1
+        if len(self.buffer) >= self.run_size:
+            self._spill()
+
+    def _write_run(self, prefix, runs, items):
+        run_path = os.path.join(self.spill_folder, f"{prefix}_{len(runs):06d}.jsonl")
+        with open(run_path, 'w') as file:
+            for item in items:
+                file.write(json.dumps(item))
+                file.write('\n')
+        runs.append(run_path)
+
+    def _spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort(key=lambda item: item[:2])
+        self._write_run('run', self.runs, self.buffer)
+        self.buffer = []
+
+    def _read_run(self, run_path):
+        with open(run_path, 'r') as file:
+            for line in file:
+                yield json.loads(line)
+
+    def _merge_runs(self, runs, key):
+        return heapq.merge(*(self._read_run(run_path) for run_path in runs), key=key)
+
+    def _build_group_runs(self):
+        """
+        Merges the row runs into groups and spills them as runs sorted by the arrival order of their first row.
+        """
+        self._spill()
+        self.group_runs = []
+        buffer = []
+        buffered_rows = 0
+        merged = self._merge_runs(self.runs, key=lambda item: item[:2])
+        for filename, items in groupby(merged, key=lambda item: item[0]):
+            items = list(items)
+            buffer.append([items[0][1], filename, [row for _, _, row in items]])
+            buffered_rows += len(items)
+            if buffered_rows >= self.run_size:
+                buffer.sort(key=lambda item: item[0])
+                self._write_run('groups', self.group_runs, buffer)
+                buffer = []
+                buffered_rows = 0
+        if buffer:
+            buffer.sort(key=lambda item: item[0])
+            self._write_run('groups', self.group_runs, buffer)
+
+    def groups(self):
+        """
+        Yields (filename, rows) for every video, in the order the videos were first read.
+        """
+        if self.group_runs is None:
+            self._build_group_runs()
+        for _, filename, rows in self._merge_runs(self.group_runs, key=lambda item: item[0]):
+            yield filename, [tuple(row) for row in rows]
+
+    def close(self):
+        shutil.rmtree(self.spill_folder, ignore_errors=True)
+        self.runs = []
+        self.group_runs = None
+        self.buffer = []
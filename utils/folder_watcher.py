@@ -0,0 +1,64 @@
+import os
+import time
+
+
+class FolderWatcher:
+    """
+    This class is responsible for noticing when files are added to, changed in or removed from a set of
+    folders. The folders are polled every interval seconds by comparing the size and mtime of their files.
+    A change is only reported once the folders have been quiet for debounce seconds, so a burst of exports,
+    or a video that is still being copied, triggers one update instead of many.
+    """
+
+    def __init__(self, folders: list, interval: float = 2.0, debounce: float = 5.0):
+        self.folders = folders
+        self.interval = interval
+        self.debounce = debounce
+        self.last_snapshot = self.snapshot()
+
+    def snapshot(self):
+        files = {}
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def _diff(self, before, after):
+        return sorted(path for path in before.keys() | after.keys()
+                      if before.get(path) != after.get(path))
+
+    def wait_for_changes(self):
+        """
+        Blocks until the folders changed and then settled, and returns the paths that changed.
+        """
+        while True:
+            time.sleep(self.interval)
+            current = self.snapshot()
+            if current == self.last_snapshot:
+                continue
+
+            quiet_since = time.monotonic()
+            while time.monotonic() - quiet_since < self.debounce:
+                time.sleep(min(self.interval, self.debounce))
+                latest = self.snapshot()
+                if latest != current:
+                    current = latest
+                    quiet_since = time.monotonic()
+
+            changes = self._diff(self.last_snapshot, current)
+            self.last_snapshot = current
+            if changes:
+                return changes
+
+    def watch(self):
+        """
+        Yields the changed paths of every settled change, until interrupted.
+        """
+        while True:
+            yield self.wait_for_changes()
@@ -0,0 +1,185 @@
+import os
+import json
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.video_backend import VideoBackend, get_backend
+
+
+class FrameExtractor:
+    """
+    This class is responsible for saving selected frames of a video, either as JPEG images or as one
+    memory-mapped .npy shard per video. The requested frame indices are merged into windows: frames closer
+    together than seek_gap seconds are decoded in one sequential ffmpeg pass, while sparse windows each start
+    with a seek. JPEGs are written from a thread pool, at most max_pending at a time so decoded frames don't pile
+    up in memory, and images or shards that already exist are not decoded again. Every file is written under a
+    temporary name and renamed into place, so an interrupted run never leaves a truncated frame behind.
+    """
+
+    def __init__(self, seek_gap: float = 5.0, write_workers: int = 4, backend: VideoBackend = None,
+                 max_pending: int = None):
+        self.seek_gap = seek_gap
+        self.write_workers = write_workers
+        self.max_pending = max_pending or write_workers * 4
+        self.backend = backend or get_backend()
+
+    def _get_ffmpeg_binary(self):
+        return self.backend.get_ffmpeg_binary()
+
+    def _get_windows(self, frames, fps):
+        windows = []
+        max_gap = max(1, int(self.seek_gap * fps))
+        for frame in frames:
+            if windows and frame - windows[-1][-1] <= max_gap:
+                windows[-1].append(frame)
+            else:
+                windows.append([frame])
+        return windows
+
+    def _write_image(self, path, data, size):
+        import numpy as np
+        import imageio
+        width, height = size
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.{os.getpid()}.part{extension}"
+        try:
+            imageio.imwrite(tmp_path, np.frombuffer(
+                data, dtype='uint8').reshape(height, width, 3))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _decode_window(self, ffmpeg, video_path, size, fps, window, on_frame):
+        """
+        Decodes the frames from window[0] to window[-1] in one pass and passes the wanted ones to on_frame.
+        """
+        first, last = window[0], window[-1]
+        # Seek half a frame early so rounding never skips the first wanted frame
+        start_time = max(0.0, (first - 0.5) / fps)
+        width, height = size
+        nbytes = width * height * 3
+        command = [ffmpeg, '-loglevel', 'error']
+        if first > 0:
+            command += ['-ss', f"{start_time:.6f}"]
+        command += ['-i', video_path, '-frames:v', str(last - first + 1),
+                    '-vf', f"scale={width}:{height}", '-f', 'image2pipe',
+                    '-pix_fmt', 'rgb24', '-vcodec', 'rawvideo', '-']
+
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        decoded = 0
+        wanted = set(window)
+        scratch = bytearray(nbytes)
+        try:
+            for frame in range(first, last + 1):
+                if frame in wanted:
+                    data = proc.stdout.read(nbytes)
+                    if len(data) != nbytes:
+                        break
+                    on_frame(frame, data)
+                    decoded += 1
+                elif proc.stdout.readinto(scratch) != nbytes:
+                    break
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        return decoded
+
+    def extract(self, video_path: str, info: dict, frame_paths: dict):
+        """
+        Saves the frames in frame_paths (frame index -> image path) and returns how many images were written.
+        """
+        frames = sorted(frame for frame, path in frame_paths.items()
+                        if not os.path.exists(path))
+        if not frames:
+            return 0
+
+        for folder in {os.path.dirname(frame_paths[frame]) for frame in frames}:
+            os.makedirs(folder, exist_ok=True)
+
+        ffmpeg = self._get_ffmpeg_binary()
+        size = info['resolution']
+        futures = deque()
+        written = 0
+        with ThreadPoolExecutor(max_workers=self.write_workers) as executor:
+            def on_frame(frame, data):
+                nonlocal written
+                # Wait for the oldest write before decoding further, so at most max_pending frames are held
+                if len(futures) >= self.max_pending:
+                    futures.popleft().result()
+                    written += 1
+                futures.append(executor.submit(
+                    self._write_image, frame_paths[frame], data, size))
+
+            for window in self._get_windows(frames, info['fps']):
+                self._decode_window(ffmpeg, video_path, size,
+                                    info['fps'], window, on_frame)
+            while futures:
+                futures.popleft().result()
+                written += 1
+
+        if written < len(frames):
+            print(f"Error: only {written} of {len(frames)} frames could be extracted from {video_path}")
+        return written
+
+    def _get_index_path(self, shard_path):
+        return os.path.splitext(shard_path)[0] + '.json'
+
+    def _is_shard_current(self, shard_path, frames, size):
+        index_path = self._get_index_path(shard_path)
+        if not os.path.exists(shard_path) or not os.path.exists(index_path):
+            return False
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return False
+        width, height = size
+        return index.get('frames') == frames and index.get('shape') == [len(frames), height, width, 3]
+
+    def extract_shard(self, video_path: str, info: dict, frames: list, shard_path: str, index: dict, size: tuple = None):
+        """
+        Saves the sorted, distinct frames into one uint8 .npy shard of shape (frames, height, width, 3),
+        optionally resized to size (width, height), next to a JSON index holding the given index fields.
+        The shard and index are only replaced when every frame was decoded. Returns how many frames were written.
+        """
+        import numpy as np
+
+        size = tuple(size or info['resolution'])
+        if not frames or self._is_shard_current(shard_path, frames, size):
+            return 0
+
+        os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+        width, height = size
+        offsets = {frame: offset for offset, frame in enumerate(frames)}
+        tmp_path = shard_path + '.part'
+        shard = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.uint8, shape=(len(frames), height, width, 3))
+
+        def on_frame(frame, data):
+            shard[offsets[frame]] = np.frombuffer(
+                data, dtype='uint8').reshape(height, width, 3)
+
+        ffmpeg = self._get_ffmpeg_binary()
+        written = 0
+        for window in self._get_windows(frames, info['fps']):
+            written += self._decode_window(ffmpeg, video_path,
+                                           size, info['fps'], window, on_frame)
+        shard.flush()
+        del shard
+        if written < len(frames):
+            # A partial shard would hold black frames and pass as current on later runs, so none is kept
+            os.remove(tmp_path)
+            print(f"Error: only {written} of {len(frames)} frames could be extracted from {video_path}")
+            return written
+        os.replace(tmp_path, shard_path)
+
+        index_path = self._get_index_path(shard_path)
+        with open(index_path + '.part', 'w') as file:
+            json.dump({**index, 'shard': os.path.basename(shard_path),
+                       'shape': [len(frames), height, width, 3], 'frames': frames}, file)
+        os.replace(index_path + '.part', index_path)
+        return written
@@ -0,0 +1,69 @@
+import json
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+
+class StreamObject:
+    """
+    Marks an iterable of (key, value) pairs that is written as a JSON object one item at a time.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+
+class StreamArray:
+    """
+    Marks an iterable of values that is written as a JSON array one item at a time.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+
+class JSONStreamWriter:
+    """
+    This class is responsible for writing JSON documents incrementally to a file.
+    StreamObject and StreamArray values are written item by item, so large documents never have to be built
+    as one string. Everything else is encoded with the standard json encoder (or simplejson, if requested and
+    installed), using the same separators and escaping as jsonpickle.encode(..., unpicklable=False),
+    so the output is byte-identical to what the parsers wrote before.
+    """
+
+    BACKENDS = ('json', 'simplejson')
+
+    def __init__(self, file, backend: str = 'json'):
+        self.file = file
+        module = simplejson if backend == 'simplejson' and simplejson is not None else json
+        self.encoder = module.JSONEncoder(default=self._to_json)
+
+    def _to_json(self, value):
+        if hasattr(value, 'to_dict'):
+            return value.to_dict()
+        if hasattr(value, '__dict__'):
+            return vars(value)
+        raise TypeError(
+            f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def write(self, value):
+        if isinstance(value, StreamObject):
+            self.file.write('{')
+            for index, (key, item) in enumerate(value.items):
+                if index:
+                    self.file.write(', ')
+                self.file.write(self.encoder.encode(key))
+                self.file.write(': ')
+                self.write(item)
+            self.file.write('}')
+        elif isinstance(value, StreamArray):
+            self.file.write('[')
+            for index, item in enumerate(value.items):
+                if index:
+                    self.file.write(', ')
+                self.write(item)
+            self.file.write(']')
+        else:
+            self.file.write(self.encoder.encode(value))
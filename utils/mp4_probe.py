@@ -0,0 +1,169 @@
+import mmap
+import os
+import struct
+
+
+class MP4Probe:
+    """
+    This class is responsible for reading video information straight from the headers of an MP4/MOV file.
+    It walks the moov/mvhd/trak boxes through a memory-mapped file, so only the header pages are read
+    and no ffmpeg process is started. Values are reported the way moviepy reports them for constant frame rate
+    files. Variable frame rate files are not parsed, as moviepy takes their fps from ffmpeg's tbr estimate, which
+    can't be derived from the headers; get_info returns None so the caller falls back to the video backend.
+    """
+
+    EXTENSIONS = ('.mp4', '.m4v', '.mov')
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _iter_boxes(self, buf, start, end):
+        offset = start
+        while offset + 8 <= end:
+            size, box_type = struct.unpack_from('>I4s', buf, offset)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack_from('>Q', buf, offset + 8)[0]
+                header_size = 16
+            elif size == 0:
+                size = end - offset
+            if size < header_size or offset + size > end:
+                raise ValueError(f"Truncated '{box_type}' box")
+            yield box_type, offset + header_size, offset + size
+            offset += size
+
+    def _find_box(self, buf, start, end, box_type):
+        for found_type, box_start, box_end in self._iter_boxes(buf, start, end):
+            if found_type == box_type:
+                return box_start, box_end
+        return None
+
+    def _find_path(self, buf, start, end, path):
+        box = (start, end)
+        for box_type in path:
+            box = self._find_box(buf, box[0], box[1], box_type)
+            if box is None:
+                return None
+        return box
+
+    def _read_timing(self, buf, start):
+        # mvhd and mdhd share the version-dependent layout of timescale and duration
+        version = buf[start]
+        if version == 1:
+            return struct.unpack_from('>IQ', buf, start + 20)
+        return struct.unpack_from('>II', buf, start + 12)
+
+    def _read_size(self, buf, trak, stbl):
+        width = height = 0
+        stsd = self._find_box(buf, stbl[0], stbl[1], b'stsd')
+        if stsd is not None and stsd[1] - stsd[0] >= 8 + 36:
+            width, height = struct.unpack_from('>HH', buf, stsd[0] + 8 + 32)
+
+        tkhd = self._find_box(buf, trak[0], trak[1], b'tkhd')
+        if tkhd is None:
+            return [width, height]
+        base = tkhd[0] + (36 if buf[tkhd[0]] == 1 else 24)
+        if not width or not height:
+            width, height = [value >> 16 for value in struct.unpack_from(
+                '>II', buf, base + 52)]
+
+        # ffmpeg reports rotated tracks with swapped dimensions
+        matrix_a, matrix_b = struct.unpack_from('>ii', buf, base + 16)
+        if matrix_a == 0 and abs(matrix_b) == 1 << 16:
+            width, height = height, width
+        return [width, height]
+
+    def _read_frame_count(self, buf, stbl):
+        """
+        Returns the sample count and total sample duration of the track, or (0, 0) when the samples don't all
+        have the same duration, i.e. the track has a variable frame rate.
+        """
+        stts = self._find_box(buf, stbl[0], stbl[1], b'stts')
+        if stts is None:
+            return 0, 0
+        entry_count = struct.unpack_from('>I', buf, stts[0] + 4)[0]
+        samples = 0
+        sample_duration = 0
+        deltas = set()
+        for index in range(entry_count):
+            count, delta = struct.unpack_from(
+                '>II', buf, stts[0] + 8 + index * 8)
+            if count:
+                deltas.add(delta)
+            samples += count
+            sample_duration += count * delta
+        if len(deltas) > 1:
+            return 0, 0
+        return samples, sample_duration
+
+    def _get_fps(self, samples, sample_duration, timescale):
+        # Mirror ffmpeg's two-decimal fps print and moviepy's 1000/1001 correction
+        fps = round(samples * timescale / sample_duration, 2)
+        coef = 1000.0 / 1001.0
+        for rate in [23, 24, 25, 30, 50]:
+            if fps != rate and abs(fps - rate * coef) < .01:
+                fps = rate * coef
+        return fps
+
+    def _parse_video_track(self, buf, trak):
+        mdia = self._find_box(buf, trak[0], trak[1], b'mdia')
+        if mdia is None:
+            return None
+        hdlr = self._find_box(buf, mdia[0], mdia[1], b'hdlr')
+        if hdlr is None or buf[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            return None
+        mdhd = self._find_box(buf, mdia[0], mdia[1], b'mdhd')
+        stbl = self._find_path(buf, mdia[0], mdia[1], [b'minf', b'stbl'])
+        if mdhd is None or stbl is None:
+            return None
+
+        timescale, _ = self._read_timing(buf, mdhd[0])
+        samples, sample_duration = self._read_frame_count(buf, stbl)
+        if not timescale or not samples or not sample_duration:
+            return None
+
+        return {
+            'resolution': self._read_size(buf, trak, stbl),
+            'fps': self._get_fps(samples, sample_duration, timescale)
+        }
+
+    def _parse(self, buf):
+        moov = self._find_box(buf, 0, len(buf), b'moov')
+        if moov is None:
+            return None
+        mvhd = self._find_box(buf, moov[0], moov[1], b'mvhd')
+        if mvhd is None:
+            return None
+        timescale, duration = self._read_timing(buf, mvhd[0])
+        if not timescale or not duration:
+            return None
+
+        for box_type, trak_start, trak_end in self._iter_boxes(buf, moov[0], moov[1]):
+            if box_type != b'trak':
+                continue
+            track = self._parse_video_track(buf, (trak_start, trak_end))
+            if track is not None:
+                # ffmpeg prints the container duration with centisecond precision
+                seconds = round(duration / timescale, 2)
+                return {
+                    'duration': seconds,
+                    'resolution': track['resolution'],
+                    'fps': track['fps'],
+                    'frames': int(track['fps'] * seconds)
+                }
+        return None
+
+    def get_info(self):
+        """
+        Returns a dict with duration, resolution, fps and frames, or None if the container can't be parsed.
+        """
+        if not self.path.lower().endswith(self.EXTENSIONS):
+            return None
+        try:
+            with open(self.path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return None
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    return self._parse(buf)
+        except (OSError, ValueError, struct.error):
+            return None
@@ -0,0 +1,185 @@
+"""
+The stages of main.py that other entry points share: probing, staging, building the NUYLSushi annotations,
+extracting their frames and running the exporters. scripts/ import them from here rather than from main.py.
+"""
+import os
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from utils.build_manifest import BuildManifest
+from utils.console import get_exporter_thread_name
+from utils.video_extractor import VideoExtractor
+
+from formats.activitynet.taxonomy import Taxonomy
+from formats.nuyl_sushi.annotation import NUYLSushiAnnotation
+
+from parsers.basic_parser import BaseParser
+from parsers.activitynet_parser import ActivityNetParser
+from parsers.kinectics_parser import KineticsParser
+
+FORMATS = ('activitynet', 'kinetics', 'nuylsushi')
+TARGET_FOLDER = './dataset/encode_videos'
+
+
+def _probe_video(video_folder, filename):
+    try:
+        return VideoExtractor(video_folder, filename).probe()
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+
+def probe_videos(filenames, video_folder, probe_cache, workers=1):
+    """
+    Probes each distinct video once and returns its info tuple keyed by filename.
+    Videos missing from the probe cache are probed in a pool of worker processes.
+    """
+    extractors = {filename: VideoExtractor(video_folder, filename, probe_cache)
+                  for filename in filenames}
+    misses = [filename for filename, extractor in extractors.items()
+              if not extractor.is_cached()]
+
+    if workers > 1 and len(misses) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_probe_video, repeat(video_folder), misses)
+            for filename, info in zip(misses, results):
+                extractors[filename].store(info)
+
+    return {filename: extractor.get_info() for filename, extractor in extractors.items()}
+
+
+def stage_annotation(annotation, stager, view_index, probe_cache, video_folder):
+    """
+    Stages the video of an annotation and points the annotation at the staged copy.
+    Returns False if the source video is missing, in which case the annotation is left out of the outputs.
+    """
+    copied_path = stager.stage(annotation.filename, video_folder)
+    if copied_path is None:
+        return False
+    # The staged copy has the same streams as its source, so reuse the probe
+    source_info = probe_cache.get(annotation.url) if annotation.url else None
+    if source_info is not None and os.path.exists(copied_path):
+        probe_cache.put(copied_path, source_info)
+    annotation.url = copied_path
+    annotation.source = os.path.normpath(os.path.join(
+        video_folder, os.path.basename(annotation.filename)))
+    annotation.view = view_index.get_view(annotation.filename)
+    annotation.filename = os.path.basename(copied_path)
+    return True
+
+
+def get_manifest_key(annotation):
+    return BuildManifest.get_video_key(annotation.source, os.path.splitext(annotation.filename)[0],
+                                       annotation.view, annotation.label)
+
+
+def build_sushi_annotations(annotations, video_processor, manifest=None, batch_size=None):
+    """
+    Yields the NUYLSushi annotation of each video, reusing the entry of the previous run for unchanged videos.
+    Given a batch_size, the pending frames are extracted after every batch_size videos instead of at the end.
+    """
+    for index, annotation in enumerate(annotations, 1):
+        if manifest is not None:
+            key = get_manifest_key(annotation)
+            entry = manifest.get_output(key, 'nuylsushi', lambda entry: video_processor.has_outputs(
+                entry['image_sampling']))
+            if entry is not None:
+                yield entry
+                continue
+
+        sushi_annotation = NUYLSushiAnnotation(annotation, video_processor)
+        if manifest is not None:
+            manifest.put_output(key, 'nuylsushi', sushi_annotation.to_dict())
+        yield sushi_annotation
+        if batch_size and index % batch_size == 0:
+            video_processor.save_pending_frames()
+
+
+def export_activitynet(output_folder, annotations, json_backend, profiler, summary=None):
+    with profiler.stage('taxonomy') as stage:
+        taxonomy = Taxonomy(summary['label_sets'] if summary is not None else annotations).get()
+        stage.items = len(taxonomy)
+
+    with profiler.stage('activitynet', [output_folder + '/activitynet']) as stage:
+        if summary is not None:
+            parser = ActivityNetParser(output_folder + '/activitynet/annotations.json', annotations, json_backend,
+                                       summary['label_sets'], summary['extra_segments'], taxonomy)
+        else:
+            parser = ActivityNetParser(
+                output_folder + '/activitynet/annotations.json', annotations, json_backend, taxonomy=taxonomy)
+        parser.write_json_data()
+        stage.items = summary['basenames'] if summary is not None else len(
+            parser.annotation['database'])
+
+
+def export_kinetics(output_folder, annotations, source_folder, link, trim_clips, profiler, summary=None):
+    with profiler.stage('kinetics', [output_folder + '/kinetics']) as stage:
+        parser = KineticsParser(output_folder + '/kinetics/', annotations, source_folder,
+                                link=link, trim=trim_clips, summary=summary)
+        parser.save_annotation()
+        stage.items = summary['videos'] if summary is not None else len(
+            annotations)
+
+
+def export_nuylsushi(output_folder, annotations, video_processor, manifest, json_backend, profiler,
+                      summary=None, batch_size=None):
+    output_folders = [output_folder + '/nuylsushi', video_processor.images_folder]
+    with profiler.stage('nuylsushi', output_folders) as stage:
+        sushi_annotations = build_sushi_annotations(
+            annotations, video_processor, manifest, batch_size)
+
+        parser = BaseParser(
+            output_folder + '/nuylsushi/annotations.json', json_backend)
+        parser.save_annotation(sushi_annotations)
+        stage.items = summary['videos'] if summary is not None else len(
+            annotations)
+    save_frames(video_processor, profiler)
+
+
+def save_frames(video_processor, profiler):
+    """
+    Extracts the frames the NUYLSushi annotations planned. Batched builds already extracted all but the last batch.
+    """
+    with profiler.stage('frames', [video_processor.images_folder]) as stage:
+        stage.items = video_processor.save_pending_frames()
+
+
+def run_exporters(exporters, profiler):
+    """
+    Runs the (name, exporter) pairs. Unless profiling, each exporter runs on its own thread named after it,
+    so the lines it prints through echo are prefixed with its name and show up as they happen.
+    """
+    # The exporters only read the annotations, so they can overlap: Kinetics copying is I/O-bound
+    # while NUYLSushi spends its time in ffmpeg. Profiled runs stay sequential to keep stages apart.
+    if len(exporters) > 1 and not profiler.enabled:
+        errors = {}
+
+        def run(name, exporter):
+            try:
+                exporter()
+            except BaseException as e:
+                errors[name] = e
+
+        threads = [threading.Thread(target=run, args=(name, exporter), name=get_exporter_thread_name(name))
+                   for name, exporter in exporters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name, _ in exporters:
+            if name in errors:
+                raise errors[name]
+    else:
+        for _, exporter in exporters:
+            exporter()
+
+
+def parse_formats(value):
+    formats = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(
+            f"Unknown output format(s) {', '.join(unknown)}, expected a comma-separated subset of {', '.join(FORMATS)}")
+    return formats
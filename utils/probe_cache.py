@@ -0,0 +1,73 @@
+import os
+import json
+
+from utils.atomic_file import atomic_open, locked
+
+
+class ProbeCache:
+    """
+    This class is responsible for persisting video probe results between runs.
+    Entries are keyed by the absolute path of a video and are only reused while its size and mtime are unchanged,
+    so reruns over an untouched footage library never have to open a decoder.
+    """
+
+    def __init__(self, cache_file: str = "./dataset/probe_cache.json"):
+        self.cache_file = cache_file
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading probe cache {self.cache_file}: {e}")
+            return {}
+
+    def _key(self, path: str):
+        return os.path.abspath(path)
+
+    def _stat(self, path: str):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def get(self, path: str):
+        """
+        Returns the cached probe info for path, or None if it is missing or the file has changed.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return None
+        try:
+            size, mtime = self._stat(path)
+        except OSError:
+            return None
+        if entry['size'] != size or entry['mtime'] != mtime:
+            return None
+        return entry['info']
+
+    def put(self, path: str, info: dict):
+        """
+        Stores probe info (duration, resolution, fps, frames) for path.
+        """
+        size, mtime = self._stat(path)
+        self.entries[self._key(path)] = {
+            'size': size,
+            'mtime': mtime,
+            'info': info
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty or not self.cache_file:
+            return
+        # Shards running side by side share the cache, so entries saved by the others since the load are kept
+        with locked(self.cache_file):
+            entries = self._load()
+            entries.update(self.entries)
+            self.entries = entries
+            with atomic_open(self.cache_file) as file:
+                json.dump(self.entries, file)
+        self.dirty = False
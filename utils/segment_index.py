@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class SegmentIndex:
+    """
+    This class is responsible for looking up which labelled segment covers a given time.
+    Segments are closed intervals [start, end]. Where segments overlap, the one listed first wins,
+    and times covered by no segment get the empty label.
+
+    The boundaries of all segments split the timeline into elementary pieces (each boundary point and each
+    open interval between two boundaries). The winning segment of every piece is computed once, so labelling
+    a batch of times is a single searchsorted over the boundaries.
+    """
+
+    def __init__(self, starts, ends, labels):
+        self.labels = np.array(list(labels) + [""], dtype=object)
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        self.boundaries = np.unique(np.concatenate([starts, ends]))
+
+        # Piece 2k is the boundary point k, piece 2k + 1 the open interval after it
+        no_segment = len(self.labels) - 1
+        self.winners = np.full(2 * len(self.boundaries), no_segment)
+        first_pieces = 2 * np.searchsorted(self.boundaries, starts)
+        last_pieces = 2 * np.searchsorted(self.boundaries, ends)
+        for index in range(len(starts) - 1, -1, -1):
+            self.winners[first_pieces[index]:last_pieces[index] + 1] = index
+
+    @classmethod
+    def from_segments(cls, segments):
+        """
+        Builds the index straight from the columns of a SegmentTable.
+        """
+        starts, ends, _ = segments.as_arrays()
+        return cls(starts, ends, segments.labels())
+
+    def lookup(self, times):
+        """
+        Returns the index of the winning segment for each time, or len(segments) for uncovered times.
+        """
+        times = np.asarray(times, dtype=float)
+        if not len(self.winners):
+            return np.full(times.shape, len(self.labels) - 1)
+        positions = np.searchsorted(self.boundaries, times)
+        on_boundary = (positions < len(self.boundaries)) & (
+            self.boundaries[np.minimum(positions, len(self.boundaries) - 1)] == times)
+        pieces = np.where(on_boundary, 2 * positions, 2 * positions - 1)
+        outside = (pieces < 0) | (pieces >= len(self.winners))
+        return np.where(outside, len(self.labels) - 1,
+                        self.winners[np.clip(pieces, 0, len(self.winners) - 1)])
+
+    def get_labels(self, times):
+        return self.labels[self.lookup(times)].tolist()
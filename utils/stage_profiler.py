@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class StageStats:
+    """
+    Holds the measurements of one pipeline stage. The stage sets items to the number of things it handled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.children_cpu_seconds = 0.0
+        self.peak_rss_bytes = 0
+        self.peak_rss_scope = 'stage'
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_created = 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'items': self.items,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'children_cpu_seconds': round(self.children_cpu_seconds, 6),
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'peak_rss_scope': self.peak_rss_scope,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'files_created': self.files_created
+        }
+
+
+class StageProfiler:
+    """
+    This class is responsible for measuring the stages of a run: wall time, CPU time of the process and of its
+    finished child processes (ffmpeg, worker pools), peak RSS, bytes read and written by the process and
+    the number of files created in the folders the stage writes to. The report is written as JSON, and one
+    stage can additionally be run under cProfile. When disabled, stages run without any measurement.
+
+    The peak RSS of a stage is the high-water mark of the process during that stage, reset at its start
+    through /proc/self/clear_refs. Where that is not available it is the high-water mark of the whole
+    process so far, and peak_rss_scope says 'process' instead of 'stage'.
+    """
+
+    STAGES = ('read_csv', 'group', 'probe', 'stage', 'taxonomy', 'activitynet', 'kinetics', 'nuylsushi',
+              'frames')
+
+    def __init__(self, report_file: str = None, cprofile_stage: str = None):
+        self.report_file = report_file
+        self.enabled = report_file is not None
+        self.cprofile_stage = cprofile_stage
+        self.stages = []
+        if self.enabled and os.path.dirname(report_file):
+            os.makedirs(os.path.dirname(report_file), exist_ok=True)
+
+    def _read_io(self):
+        # rchar/wchar count every read and write call, including those served from the page cache
+        try:
+            with open('/proc/self/io', 'r') as file:
+                fields = dict(line.split(': ') for line in file.read().splitlines())
+            return int(fields['rchar']), int(fields['wchar'])
+        except (OSError, KeyError, ValueError):
+            return 0, 0
+
+    def _list_files(self, folders):
+        paths = set()
+        for folder in folders:
+            for root, _, filenames in os.walk(folder):
+                paths.update(os.path.join(root, filename)
+                             for filename in filenames)
+        return paths
+
+    def _reset_peak_rss(self):
+        # Writing 5 resets VmHWM, the RSS high-water mark of the process, on Linux
+        try:
+            with open('/proc/self/clear_refs', 'w') as file:
+                file.write('5')
+            return True
+        except OSError:
+            return False
+
+    def _read_hwm(self):
+        try:
+            with open('/proc/self/status', 'r') as file:
+                for line in file:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _get_peak_rss(self):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _get_children_cpu(self):
+        if resource is None:
+            return 0.0
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    @contextmanager
+    def stage(self, name: str, output_folders: list = None):
+        """
+        Measures the stage run in the with block. Only the output_folders are searched for created files.
+        """
+        stats = StageStats(name)
+        if not self.enabled:
+            yield stats
+            return
+
+        output_folders = output_folders or []
+        files_before = self._list_files(output_folders)
+        is_reset = self._reset_peak_rss()
+        read_before, written_before = self._read_io()
+        children_before = self._get_children_cpu()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        profile = cProfile.Profile() if name == self.cprofile_stage else None
+        if profile is not None:
+            profile.enable()
+        try:
+            yield stats
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self._get_cprofile_filename(name))
+            stats.wall_seconds = time.perf_counter() - wall_before
+            stats.cpu_seconds = time.process_time() - cpu_before
+            stats.children_cpu_seconds = self._get_children_cpu() - children_before
+            read_after, written_after = self._read_io()
+            stats.bytes_read = read_after - read_before
+            stats.bytes_written = written_after - written_before
+            stats.files_created = len(
+                self._list_files(output_folders) - files_before)
+            hwm = self._read_hwm() if is_reset else None
+            if hwm is not None:
+                stats.peak_rss_bytes = hwm
+            else:
+                stats.peak_rss_bytes = self._get_peak_rss()
+                stats.peak_rss_scope = 'process'
+            self.stages.append(stats)
+
+    def _get_cprofile_filename(self, name):
+        return f"{os.path.splitext(self.report_file)[0]}.{name}.prof"
+
+    def save(self):
+        if not self.enabled:
+            return
+        report = {
+            'stages': [stats.to_dict() for stats in self.stages],
+            'total': {
+                'wall_seconds': round(sum(stats.wall_seconds for stats in self.stages), 6),
+                'cpu_seconds': round(sum(stats.cpu_seconds for stats in self.stages), 6),
+                'children_cpu_seconds': round(sum(stats.children_cpu_seconds for stats in self.stages), 6),
+                'peak_rss_bytes': max([self._get_peak_rss()] + [stats.peak_rss_bytes for stats in self.stages]),
+                'bytes_read': sum(stats.bytes_read for stats in self.stages),
+                'bytes_written': sum(stats.bytes_written for stats in self.stages),
+                'files_created': sum(stats.files_created for stats in self.stages)
+            }
+        }
+        with open(self.report_file, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Profile report written to {self.report_file}")
@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+
+
+class VideoBackend(ABC):
+    """
+    This class is the interface to the library that opens videos. A backend probes containers the native
+    MP4 parser can't read and locates the ffmpeg binary used for decoding and trimming.
+    Backends import their library on first use, so code paths that never touch a video don't pay for it.
+    A backend must implement every abstract method, otherwise it can't be instantiated.
+    """
+
+    name = None
+
+    @abstractmethod
+    def probe(self, path: str) -> dict:
+        """
+        Returns a dict with the duration, resolution, fps and frames of the video at path.
+        """
+
+    @abstractmethod
+    def get_ffmpeg_binary(self) -> str:
+        """
+        Returns the path of the ffmpeg binary.
+        """
+
+
+class MoviePyBackend(VideoBackend):
+    """
+    Video backend built on moviepy. Only the VideoFileClip reader and the config module are imported,
+    not moviepy.editor with all its effects.
+    """
+
+    name = 'moviepy'
+
+    def probe(self, path: str) -> dict:
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+
+        video = VideoFileClip(path)
+        try:
+            return {
+                'duration': video.duration,
+                'resolution': list(video.size),
+                'fps': video.fps,
+                'frames': int(video.fps * video.duration)
+            }
+        finally:
+            video.close()
+
+    def get_ffmpeg_binary(self) -> str:
+        from moviepy.config import get_setting
+        return get_setting("FFMPEG_BINARY")
+
+
+BACKENDS = {backend.name: backend for backend in (MoviePyBackend,)}
+_instances = {}
+
+
+def get_backend(name: str = 'moviepy') -> VideoBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown video backend '{name}', expected one of {tuple(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
@@ -1,27 +1,69 @@
 import os
-from moviepy.editor import VideoFileClip
+
+from utils.mp4_probe import MP4Probe
+from utils.probe_cache import ProbeCache
+from utils.video_backend import VideoBackend, get_backend
 
 
 class VideoExtractor:
     """
     This class is responsible for extracting information from a video file.
     It provides a method to get the duration, size, and URL of a video file.
+    MP4/MOV headers are parsed natively and the video backend (moviepy) is only used for containers that can't be parsed.
+    Probe results are read from and written to an optional ProbeCache.
     """
 
-    def __init__(self, folder: str, filename: str):
+    def __init__(self, folder: str, filename: str, cache: ProbeCache = None, backend: VideoBackend = None):
         self.folder = folder
         self.filename = filename
+        self.cache = cache
+        self.backend = backend or get_backend()
+
+    def _get_url(self):
+        return os.path.normpath(os.path.join(
+            self.folder or os.getcwd(), self.filename))
+
+    def _probe_file(self, url):
+        info = MP4Probe(url).get_info()
+        if info is not None:
+            return info
+
+        return self.backend.probe(url)
+
+    def is_cached(self):
+        return self.cache is not None and self.cache.get(self._get_url()) is not None
+
+    def store(self, info: dict):
+        """
+        Stores probe info produced elsewhere, e.g. by a worker process, in the cache.
+        """
+        if self.cache is not None and info is not None:
+            self.cache.put(self._get_url(), info)
+
+    def probe(self):
+        """
+        Returns a dict with duration, resolution, fps and frames, or None if the video does not exist.
+        """
+        url = self._get_url()
+        if not os.path.exists(url):
+            return None
+
+        if self.cache is not None:
+            info = self.cache.get(url)
+            if info is not None:
+                return info
+
+        info = self._probe_file(url)
+        if self.cache is not None:
+            self.cache.put(url, info)
+        return info
 
     def get_info(self):
         try:
-            url = os.path.normpath(os.path.join(
-                self.folder or os.getcwd(), self.filename))
-            if os.path.exists(url):
-                video = VideoFileClip(url)
-                total_frames = int(video.fps * video.duration)
-                return (video.duration, video.size, url, total_frames)
-            else:
+            info = self.probe()
+            if info is None:
                 return None
+            return (info['duration'], info['resolution'], self._get_url(), info['frames'])
         except Exception as e:
             print(f"Error: {e}")
             return None
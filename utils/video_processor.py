@@ -1,28 +1,140 @@
 import os
-from moviepy.editor import VideoFileClip
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.console import echo
+from utils.frame_extractor import FrameExtractor
+from utils.probe_cache import ProbeCache
+from utils.video_registry import VideoRegistry
+from utils.video_extractor import VideoExtractor
+
+
+def _run_job(job):
+    method, args = job
+    return method(*args)
+
+
+def _get_mp_context():
+    # The frames can be extracted from an exporter thread. Forking a process that runs other threads can copy
+    # their held locks into the workers, so they are started from a clean server process, or spawned.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
 
 
 class VideoProcessor:
-    def __init__(self, images_folder="./dataset/images", fps=15, log_file="./dataset/filename_log.txt"):
+    OUTPUTS = ('jpeg', 'shard')
+
+    def __init__(self, images_folder="./dataset/images", fps=15, registry: VideoRegistry = None, cache: ProbeCache = None,
+                 extract_frames=True, workers=1, frame_extractor: FrameExtractor = None, output='jpeg', shard_size=None):
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown frame output '{output}', expected one of {self.OUTPUTS}")
         self.images_folder = images_folder
         self.fps = fps
-        self.log_file = log_file
+        self.output = output
+        self.shard_size = shard_size
+        self.registry = registry
+        self.cache = cache
+        self.extract_frames = extract_frames
+        self.workers = workers
+        self.frame_extractor = frame_extractor or FrameExtractor()
         self.total_frames = 0
+        self.pending = []
 
-    def process_video(self, filename, annotations):
+    def process_video(self, filename, segments):
         video_id = os.path.splitext(os.path.basename(filename))[0]
-        image_pairs, total_frames = self.extract_images(
-            video_id, filename, annotations)
-        self._log_frame_info(filename, video_id,
-                             total_frames, len(image_pairs))
+        image_pairs, _ = self.extract_images(
+            video_id, filename, segments)
+        if self.registry is not None:
+            self.registry.put_frame_stats(video_id, self.fps, len(image_pairs))
         return image_pairs
 
-    def _log_frame_info(self, original_filename, video_id, extracted_frames, current_frames):
-        with open(self.log_file, 'a') as log:
-            log.write(f"Video ID: {video_id}, Original: {original_filename}, Extracted Frames: {
-                      extracted_frames}, Current Frames: {current_frames}\n")
+    def has_outputs(self, image_sampling: dict):
+        """
+        Tells whether the frame files an image_sampling entry refers to exist, listing each frame folder once.
+        """
+        if not self.extract_frames:
+            return True
+        folders = {}
+        for pair in image_sampling['image_text_pairs']:
+            path = pair.get('image_path') or pair.get('shard_path')
+            folder, filename = os.path.split(path)
+            if folder not in folders:
+                try:
+                    folders[folder] = set(os.listdir(folder))
+                except OSError:
+                    return False
+            if filename not in folders[folder]:
+                return False
+        return True
+
+    def _get_sample_frames(self, segments, video_fps):
+        """
+        Returns the sampled frame numbers and times of all segments, in segment order.
+        Every self.fps-th frame from the first frame of a segment is sampled while its time lies within the segment.
+        """
+        import numpy as np
+
+        start_times, end_times, _ = segments.as_arrays()
+        start_frames = (start_times * video_fps).astype(np.int64)
+        end_frames = (end_times * video_fps).astype(np.int64)
+
+        # Same sample counts as range(start_frame, end_frame, self.fps)
+        counts = np.maximum(0, -((start_frames - end_frames) // self.fps))
+        owners = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - \
+            np.repeat(np.cumsum(counts) - counts, counts)
+
+        frame_numbers = start_frames[owners] + offsets * self.fps
+        real_times = frame_numbers / video_fps
+        keep = (real_times >= start_times[owners]) & (
+            real_times <= end_times[owners])
+        return frame_numbers[keep], real_times[keep]
+
+    def get_image_entry(self, image):
+        """
+        Returns how a sampled image is referenced in the NUYLSushi annotations.
+        """
+        if self.output == 'shard':
+            shard_path, offset = image
+            return {"shard_path": os.path.normpath(shard_path), "frame_offset": offset}
+        return {"image_path": os.path.normpath(image)}
+
+    def _plan_shard(self, video_id, video_path, info, segments, frame_numbers, real_times):
+        """
+        Plans one shard holding each distinct sampled frame once and returns the (shard, offset) of every sample.
+        """
+        import numpy as np
+        from utils.segment_index import SegmentIndex
+
+        shard_path = os.path.join(
+            self.images_folder, video_id, f"fps{self.fps}.npy")
+        shard_frames = np.unique(frame_numbers)
+        offsets = np.searchsorted(shard_frames, frame_numbers)
+
+        if self.extract_frames and len(shard_frames):
+            timestamps = shard_frames / info['fps']
+            labels = SegmentIndex.from_segments(
+                segments).get_labels(timestamps)
+            index = {'video_path': video_path, 'sampling_rate': self.fps,
+                     'timestamps': timestamps.tolist(), 'labels': labels}
+            self.pending.append((self.frame_extractor.extract_shard,
+                                 (video_path, info, shard_frames.tolist(), shard_path, index, self.shard_size)))
+
+        return [(shard_path, offset) for offset in offsets.tolist()], real_times.tolist()
+
+    def extract_images(self, video_id, video_path, segments):
+        info = VideoExtractor(None, video_path, self.cache).probe()
+        video_fps = info['fps']
+        total_frames = info['frames']
+        self.total_frames += total_frames
+
+        frame_numbers, real_times = self._get_sample_frames(
+            segments, video_fps)
+        if self.output == 'shard':
+            images, times = self._plan_shard(
+                video_id, video_path, info, segments, frame_numbers, real_times)
+            return list(zip(images, times)), total_frames
 
-    def extract_images(self, video_id, video_path, annotations):
         images_path = os.path.join(
             self.images_folder, video_id, f"fps{self.fps}")
 
@@ -30,29 +142,33 @@ class VideoProcessor:
             os.makedirs(self.images_folder)
         if not os.path.exists(images_path):
             os.makedirs(images_path)
-
-        clip = VideoFileClip(video_path)
-        total_frames = int(clip.fps * clip.duration)
-        self.total_frames += total_frames
         image_paths = []
         image_times = []
+        frame_paths = {}
 
-        for annotation in annotations:
-            start_time = annotation['start_time']
-            end_time = annotation['end_time']
-            start_frame = int(start_time * clip.fps)
-            end_frame = int(end_time * clip.fps)
-
-            for frame_number in range(start_frame, end_frame, self.fps):
-                real_time = frame_number / clip.fps
-                if real_time < start_time or real_time > end_time:
-                    continue
-                img_path = os.path.join(
-                    images_path, f"{video_id}_{real_time}.jpg")
-                # clip.save_frame(img_path, real_time)
-                image_paths.append(img_path)
-                image_times.append(real_time)
+        for frame_number, real_time in zip(frame_numbers.tolist(), real_times.tolist()):
+            img_path = os.path.join(
+                images_path, f"{video_id}_{real_time}.jpg")
+            frame_paths[frame_number] = img_path
+            image_paths.append(img_path)
+            image_times.append(real_time)
 
         image_pairs = list(zip(image_paths, image_times))
+        if self.extract_frames and frame_paths:
+            self.pending.append(
+                (self.frame_extractor.extract, (video_path, info, frame_paths)))
 
         return image_pairs, total_frames
+
+    def save_pending_frames(self):
+        """
+        Extracts the frames planned by process_video, one video per worker process.
+        """
+        pending, self.pending = self.pending, []
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=_get_mp_context()) as executor:
+                written = sum(executor.map(_run_job, pending))
+        else:
+            written = sum(_run_job(job) for job in pending)
+        echo(f"Frames extracted: {written} frames from {len(pending)} videos")
+        return written
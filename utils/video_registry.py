@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+class VideoRegistry:
+    """
+    This class is responsible for the persistent registry of staged videos, an embedded SQLite database.
+    The sources table maps every original video path to its content hash and video ID, remembered per size and
+    mtime so unchanged videos are not rehashed. The videos table holds, per video ID, the staged path and the
+    frame sampling stats; probe info is owned by the ProbeCache, keyed by the staged path. Writes are queued and flushed in one transaction per batch; lookups go
+    through the primary keys and the indexes on video ID, hash and original name.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            source_path TEXT PRIMARY KEY,
+            original_name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sources_video_id ON sources (video_id);
+        CREATE INDEX IF NOT EXISTS sources_hash ON sources (hash);
+        CREATE INDEX IF NOT EXISTS sources_original_name ON sources (original_name);
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id TEXT PRIMARY KEY,
+            staged_path TEXT,
+            sampling_rate INTEGER,
+            sampled_frames INTEGER,
+            updated REAL NOT NULL
+        );
+    """
+
+    PUT_SOURCE = """
+        INSERT INTO sources (source_path, original_name, size, mtime, hash, video_id, updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source_path) DO UPDATE SET original_name = excluded.original_name, size = excluded.size,
+            mtime = excluded.mtime, hash = excluded.hash, video_id = excluded.video_id, updated = excluded.updated
+    """
+    PUT_STAGED = """
+        INSERT INTO videos (video_id, staged_path, updated) VALUES (?, ?, ?)
+        ON CONFLICT (video_id) DO UPDATE SET staged_path = excluded.staged_path, updated = excluded.updated
+    """
+    PUT_FRAME_STATS = """
+        INSERT INTO videos (video_id, sampling_rate, sampled_frames, updated) VALUES (?, ?, ?, ?)
+        ON CONFLICT (video_id) DO UPDATE SET sampling_rate = excluded.sampling_rate,
+            sampled_frames = excluded.sampled_frames, updated = excluded.updated
+    """
+
+    def __init__(self, db_file: str = "./dataset/registry.sqlite", batch_size: int = 1000):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        folder_path = os.path.dirname(db_file)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        # Frame stats arrive from the NUYLSushi exporter thread, so access is serialized by a lock
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pending_sources = {}
+        self.pending_count = 0
+
+    def _queue(self, statement, row):
+        with self.lock:
+            self.pending.setdefault(statement, []).append(row)
+            self.pending_count += 1
+            full = self.pending_count >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the queued rows in a single transaction.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.pending_sources = {}
+            self.pending_count = 0
+            if not pending:
+                return
+            with self.connection:
+                for statement, rows in pending.items():
+                    self.connection.executemany(statement, rows)
+
+    def get_source(self, source_path: str):
+        """
+        Returns the registered size, mtime, hash and video ID of a source path, or None.
+        """
+        key = os.path.abspath(source_path)
+        with self.lock:
+            entry = self.pending_sources.get(key)
+            if entry is not None:
+                return entry
+            row = self.connection.execute(
+                "SELECT size, mtime, hash, video_id FROM sources WHERE source_path = ?", (key,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def put_source(self, source_path: str, original_name: str, size: int, mtime: int, content_hash: str, video_id: str):
+        key = os.path.abspath(source_path)
+        with self.lock:
+            self.pending_sources[key] = {
+                'size': size, 'mtime': mtime, 'hash': content_hash, 'video_id': video_id}
+        self._queue(self.PUT_SOURCE, (key, original_name, size,
+                    mtime, content_hash, video_id, time.time()))
+
+    def put_staged(self, video_id: str, staged_path: str):
+        self._queue(self.PUT_STAGED, (video_id, staged_path, time.time()))
+
+    def put_frame_stats(self, video_id: str, sampling_rate: int, sampled_frames: int):
+        self._queue(self.PUT_FRAME_STATS,
+                    (video_id, sampling_rate, sampled_frames, time.time()))
+
+    def _query(self, sql, params=()):
+        self.flush()
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def find(self, name: str):
+        """
+        Returns the sources matching a source path, original filename, content hash or video ID.
+        """
+        return self._query(
+            "SELECT * FROM sources WHERE source_path = ? OR original_name = ? OR hash = ? OR video_id = ?",
+            (os.path.abspath(name), os.path.basename(name), name, name))
+
+    def get_staged_paths(self, content_hash: str, exclude: str = None):
+        """
+        Returns the staged paths of the videos with the given content hash, other than video ID exclude.
+        """
+        rows = self._query(
+            "SELECT DISTINCT videos.staged_path FROM sources JOIN videos ON sources.video_id = videos.video_id "
+            "WHERE sources.hash = ? AND sources.video_id != ? AND videos.staged_path IS NOT NULL "
+            "ORDER BY videos.staged_path", (content_hash, exclude or ''))
+        return [row['staged_path'] for row in rows if os.path.exists(row['staged_path'])]
+
+    def get_video(self, video_id: str):
+        rows = self._query("SELECT * FROM videos WHERE video_id = ?", (video_id,))
+        return rows[0] if rows else None
+
+    def videos(self):
+        return self._query("SELECT * FROM videos ORDER BY video_id")
+
+    def sources(self):
+        return self._query("SELECT * FROM sources ORDER BY source_path")
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,166 @@
+import os
+import shutil
+import string
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils.video_registry import VideoRegistry
+
+
+class VideoStager:
+    """
+    This class is responsible for staging source videos into the encode folder under a stable video ID.
+    The ID is derived from the content hash and the filename of the video and remembered in the VideoRegistry per
+    source path, size and mtime, so reruns reuse it without rehashing. Sources with identical content keep their
+    own IDs and annotations, but share one staged file: later ones are hardlinked to the first one staged.
+    Videos are hardlinked, reflinked or symlinked where possible and copied otherwise, videos that are already
+    staged are skipped, and sources that don't exist are not staged at all.
+    """
+
+    MODES = ('auto', 'hardlink', 'reflink', 'symlink', 'copy')
+    ID_ALPHABET = string.ascii_letters + string.digits
+    ID_LENGTH = 11
+    FICLONE = 0x40049409
+
+    def __init__(self, target_folder: str = "./dataset/encode_videos", mode: str = 'auto',
+                 registry: VideoRegistry = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown staging mode '{mode}', expected one of {self.MODES}")
+        self.target_folder = target_folder
+        self.mode = mode
+        self.registry = registry or VideoRegistry()
+        self.missing = 0
+        self.deduplicated = 0
+
+    def _encode_id(self, digest: bytes):
+        value = int.from_bytes(digest, 'big')
+        chars = []
+        for _ in range(self.ID_LENGTH):
+            value, remainder = divmod(value, len(self.ID_ALPHABET))
+            chars.append(self.ID_ALPHABET[remainder])
+        return ''.join(chars)
+
+    def _hash_file(self, path: str):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def get_source(self, source_path: str):
+        """
+        Returns the content hash and the video ID of source_path, hashing its content only if it is new or has changed.
+        """
+        stat = os.stat(source_path)
+        entry = self.registry.get_source(source_path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['hash'], entry['video_id']
+
+        content_hash = self._hash_file(source_path)
+        original_name = os.path.basename(source_path)
+        # The filename is part of the ID, so copies of a video annotated separately stay separate videos
+        video_id = self._encode_id(hashlib.sha256(
+            f"{content_hash}:{original_name}".encode()).digest())
+        self.registry.put_source(source_path, original_name, stat.st_size, stat.st_mtime_ns,
+                                 content_hash, video_id)
+        return content_hash, video_id
+
+    def get_video_id(self, source_path: str):
+        return self.get_source(source_path)[1]
+
+    def _reflink(self, source_path: str, target_path: str):
+        if fcntl is None:
+            raise OSError("Reflinks are not supported on this platform")
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            try:
+                fcntl.ioctl(target.fileno(), self.FICLONE, source.fileno())
+            except OSError:
+                target.close()
+                os.remove(target_path)
+                raise
+        shutil.copystat(source_path, target_path)
+
+    def _link(self, source_path: str, target_path: str):
+        """
+        Stages source_path at target_path according to the mode and returns how it was done.
+        """
+        if self.mode == 'symlink':
+            os.symlink(os.path.abspath(source_path), target_path)
+            return 'symlinked'
+        if self.mode in ('auto', 'hardlink'):
+            try:
+                os.link(source_path, target_path)
+                return 'hardlinked'
+            except OSError:
+                pass
+        if self.mode in ('auto', 'reflink'):
+            try:
+                self._reflink(source_path, target_path)
+                return 'reflinked'
+            except OSError:
+                pass
+        shutil.copy(source_path, target_path)
+        return 'copied'
+
+    def _is_staged(self, source_path: str, target_path: str):
+        if not os.path.lexists(target_path):
+            return False
+        try:
+            return os.path.getsize(target_path) == os.path.getsize(source_path)
+        except OSError:
+            return False
+
+    def _link_duplicate(self, content_hash: str, video_id: str, target_path: str):
+        """
+        Hardlinks target_path to a video with the same content that is already staged, returning whether it did.
+        """
+        for staged_path in self.registry.get_staged_paths(content_hash, exclude=video_id):
+            try:
+                os.link(staged_path, target_path)
+                return True
+            except OSError:
+                continue
+        return False
+
+    def stage(self, filename: str, source_folder: str):
+        """
+        Stages a video and returns its path in the target folder, or None if the source video does not exist.
+        """
+        source_path = os.path.normpath(os.path.join(
+            source_folder, os.path.basename(filename)))
+
+        os.makedirs(self.target_folder, exist_ok=True)
+
+        if not os.path.exists(source_path):
+            print(f"Error: File not found - {source_path}")
+            self.missing += 1
+            return None
+
+        content_hash, video_id = self.get_source(source_path)
+        target_path = os.path.normpath(os.path.join(
+            self.target_folder, f"{video_id}.mp4"))
+
+        if not self._is_staged(source_path, target_path):
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+            # Symlinks take no space, so only hardlinks, reflinks and copies share a staged duplicate
+            if self.mode != 'symlink' and self._link_duplicate(content_hash, video_id, target_path):
+                self.deduplicated += 1
+                print(f"Video {source_path} is a duplicate, linked to its staged copy as {target_path}")
+            else:
+                method = self._link(source_path, target_path)
+                print(f"Video {method} and renamed to {target_path}")
+
+        self.registry.put_staged(video_id, target_path)
+        return target_path
+
+    def save(self):
+        self.registry.flush()
+        if self.missing:
+            print(f"Skipped {self.missing} videos whose source file is missing")
+        if self.deduplicated:
+            print(f"Staged {self.deduplicated} duplicate videos as links to an identical staged video")
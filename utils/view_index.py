@@ -0,0 +1,96 @@
+import os
+import json
+import fnmatch
+
+from utils.atomic_file import atomic_open
+
+
+class ViewIndex:
+    """
+    This class is responsible for telling which camera view a video was recorded from.
+    The filenames of each view are loaded once from video_filenames.json into one hash map. When the view
+    folders (dataset/front_view, dataset/side_view) exist and their mtimes differ from the ones recorded in the
+    index, the index is rebuilt from the folders and saved, so it never goes stale.
+    Filenames not listed in any view are matched against pattern rules, (glob pattern, view) pairs checked
+    in order, and otherwise get the default view. A filename listed in several views gets the last one.
+    """
+
+    def __init__(self, index_file: str = 'video_filenames.json', view_folders: dict = None, rules: list = None,
+                 default: str = 'front_view', refresh: bool = True):
+        self.index_file = index_file
+        self.view_folders = view_folders if view_folders is not None else {
+            'front_view': './dataset/front_view',
+            'side_view': './dataset/side_view'
+        }
+        self.rules = list(rules or [])
+        self.default = default
+        self.views = {}
+        # Callers that rebuild the index right away skip the initial load, so the folders are scanned once
+        if refresh:
+            self.refresh()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading view index {self.index_file}: {e}")
+            return {}
+
+    def _get_folder_mtimes(self):
+        mtimes = {}
+        for view, folder in self.view_folders.items():
+            if os.path.isdir(folder):
+                mtimes[view] = os.stat(folder).st_mtime_ns
+        return mtimes
+
+    def _read_folder(self, folder):
+        return sorted(filename for filename in os.listdir(folder) if filename.endswith('.mp4'))
+
+    def refresh(self):
+        """
+        Loads the index, rebuilding it first if a view folder changed since it was written.
+        """
+        stored = self._load()
+        mtimes = self._get_folder_mtimes()
+        if mtimes and stored.get('mtimes') != mtimes:
+            stored = self.rebuild(mtimes)
+
+        self.views = {}
+        for view, filenames in stored.items():
+            if view == 'mtimes':
+                continue
+            for filename in filenames:
+                self.views[filename] = view
+
+    def rebuild(self, mtimes: dict = None):
+        """
+        Rescans the view folders and saves the index.
+        """
+        mtimes = mtimes or self._get_folder_mtimes()
+        index = {view: self._read_folder(folder) if view in mtimes else []
+                 for view, folder in self.view_folders.items()}
+        index['mtimes'] = mtimes
+
+        folder_path = os.path.dirname(self.index_file)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        with atomic_open(self.index_file) as file:
+            json.dump(index, file, indent=4)
+        return index
+
+    def get_view(self, filename: str):
+        view = self.views.get(filename)
+        if view is not None:
+            return view
+        for pattern, rule_view in self.rules:
+            if fnmatch.fnmatchcase(filename, pattern):
+                view = rule_view
+                break
+        else:
+            view = self.default
+        # Remember the outcome so each filename is matched against the rules only once
+        self.views[filename] = view
+        return view